@@ -1,10 +1,18 @@
 # main.py
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Dict, Any, Optional, List
-from core.proceduralEngine import ProceduralStoryEngine
+from core.proceduralEngine import HISTORY_VERBS, ProceduralStoryEngine, scene_diff
+from core.sessionStore import SessionManager, VersionConflict, create_session_store
+from core.worldPool import WorldPool
+from core.contentRegistry import ContentRegistry
+from core.templateReload import TemplateVersionUnavailable
+from core.admission import RateLimiter, WorkPool, generation_pool, retry_after
+from core.autosave import AutosaveService
+from core.suggestions import SuggestionIndex
+from core.enginePool import EnginePool
 import os
 import requests
 import difflib
@@ -27,18 +35,131 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-story_engine = ProceduralStoryEngine(templates_file="templates.json")
+# Adventures are served side by side: templates.json is the default content
+# set and CONTENT_DIR/<id>.json are loaded on first use. STORY_FILE is
+# registered as the 'story' set for StoryEngine. Every loaded set is watched
+# and reloaded without a restart; runs keep the version they started on.
+content = ContentRegistry(
+    directory=os.environ.get("CONTENT_DIR", "content"),
+    default_path="templates.json",
+    memory_budget=int(float(os.environ.get("CONTENT_MEMORY_BUDGET_MB", "256")) * 1024 * 1024),
+    interval=float(os.environ.get("TEMPLATE_RELOAD_INTERVAL", "1.0")),
+    archive=os.environ.get("TEMPLATE_ARCHIVE_DIR", "template_versions"),
+    stories={"story": os.environ.get("STORY_FILE", "story.json")}
+)
+templates = content.get()
+template_engine = ProceduralStoryEngine(templates=templates.current.templates)
+
+print(f"Templates loaded successfully: {len(template_engine.templates)} sections (version {templates.current.version})")
+print(f"Available locations: {list(template_engine.templates['locations'].keys())}")
+
+# Game state lives in a shared session store so any worker can serve any player.
+# Use SESSION_STORE=sqlite:///sessions.db or redis://host:6379/0 when running
+# more than one gunicorn worker.
+SESSION_STORE = os.environ.get("SESSION_STORE", "memory")
+sessions = SessionManager(create_session_store(SESSION_STORE), content)
+print(f"Session store: {SESSION_STORE}")
+
+# Pre-generated worlds for unseeded runs of the default content, refilled by a
+# background process pool.
+world_pool = WorldPool(
+    templates.current.templates,
+    depth=int(os.environ.get("WORLD_POOL_DEPTH", "4")),
+    workers=int(os.environ.get("WORLD_POOL_WORKERS", "1")),
+    template_version=templates.current.version
+)
+templates.on_swap(lambda version: world_pool.reset(version.templates, version.version))
+
+# Admission control: commands are rate limited per player and globally, and
+# at most CLASSIFIER_CONCURRENCY remote classifier calls run at once. When the
+# classifier pool is full, commands are matched locally instead of waiting.
+# /intent has buckets of its own, so classifying a typed command does not use
+# up the budget of the command it precedes.
+command_limiter = RateLimiter(
+    rate=float(os.environ.get("COMMAND_RATE", "5")),
+    burst=float(os.environ.get("COMMAND_BURST", "10")),
+    global_rate=float(os.environ.get("GLOBAL_COMMAND_RATE", "200")),
+    global_burst=float(os.environ.get("GLOBAL_COMMAND_BURST", "400"))
+)
+intent_limiter = RateLimiter(
+    rate=float(os.environ.get("INTENT_RATE", "5")),
+    burst=float(os.environ.get("INTENT_BURST", "10")),
+    global_rate=float(os.environ.get("GLOBAL_INTENT_RATE", "200")),
+    global_burst=float(os.environ.get("GLOBAL_INTENT_BURST", "400"))
+)
+classifier_pool = WorkPool("classifier", int(os.environ.get("CLASSIFIER_CONCURRENCY", "4")))
+CLASSIFIER_TIMEOUT = float(os.environ.get("CLASSIFIER_TIMEOUT", "5"))
+# Story engines share one text generation pool of GENERATION_CONCURRENCY slots.
+generation_pool.limit = int(os.environ.get("GENERATION_CONCURRENCY", "1"))
+
+# Engine work runs on ENGINE_WORKERS threads instead of the event loop, one
+# request per session at a time. ENGINE_WORKERS=0 runs it inline on the loop.
+engine_pool = EnginePool(workers=int(os.environ.get("ENGINE_WORKERS", "8")))
+
+# Runs are autosaved to AUTOSAVE_DIR every game_settings.autosave_frequency
+# commands, and at least every AUTOSAVE_INTERVAL seconds while they change.
+autosave = AutosaveService(
+    directory=os.environ.get("AUTOSAVE_DIR", "autosaves"),
+    interval=float(os.environ.get("AUTOSAVE_INTERVAL", "30")),
+    locks=engine_pool.locks
+)
+# Sessions the store does not know (after a restart with the memory store)
+# resume from their autosave.
+sessions.recover = autosave.read
+
+# Next-move suggestions learned online from the choices players pick, merged
+# into SUGGESTIONS_FILE with every full autosave flush and on shutdown, and
+# loaded again on start. Workers may share the file.
+SUGGESTIONS_FILE = os.environ.get("SUGGESTIONS_FILE", "suggestions.json")
+suggestions = SuggestionIndex(max_contexts=int(os.environ.get("SUGGESTIONS_MAX_CONTEXTS", "50000")))
+if suggestions.load(SUGGESTIONS_FILE):
+    print(f"Suggestion index loaded from {SUGGESTIONS_FILE}: {suggestions.stats()['contexts']} contexts")
+autosave.on_flush(lambda: suggestions.save(SUGGESTIONS_FILE))
+
+@app.on_event("startup")
+async def start_background_services():
+    world_pool.start()
+    content.start()
+    autosave.start()
 
-print(f"Templates loaded successfully: {len(story_engine.templates)} sections")
-print(f"Available locations: {list(story_engine.templates['locations'].keys())}")
+@app.on_event("shutdown")
+async def stop_background_services():
+    await autosave.stop()
+    content.stop()
+    world_pool.shutdown()
+    engine_pool.shutdown()
+
+def get_session_id(x_session_id: Optional[str] = Header(None)) -> str:
+    return x_session_id or "default"
+
+def get_rate_key(request: Request, x_session_id: Optional[str] = Header(None)) -> str:
+    """Identifies the player for rate limiting: the session, or the client address for requests without one."""
+    if x_session_id:
+        return x_session_id
+    return f"addr:{request.client.host}" if request.client else "default"
+
+def version_conflict(session_id: str) -> HTTPException:
+    return HTTPException(status_code=409, detail=f"Session '{session_id}' was updated by another request. Please retry.")
+
+def templates_unavailable(e: TemplateVersionUnavailable) -> HTTPException:
+    return HTTPException(status_code=410, detail=f"{e}. This run cannot be continued; start a new run.")
+
+def too_many_requests(wait: float) -> HTTPException:
+    return HTTPException(status_code=429, detail="Too many requests. Please slow down.", headers={"Retry-After": retry_after(wait)})
 
 class CommandInput(BaseModel):
     command: str
 
+# Largest synthesized world a run may ask for, in cells per side. Regions are
+# built as the player reaches them, so this bounds coordinates, not memory.
+MAX_WORLD_SIZE = int(os.environ.get("MAX_WORLD_SIZE", "4096"))
+
 class StartRunInput(BaseModel):
     seed: Optional[str] = None
     name: Optional[str] = None
     chosenClass: Optional[str] = None
+    world_size: Optional[int] = Field(None, ge=1, le=MAX_WORLD_SIZE)
+    content_id: Optional[str] = None
 
 class SaveGameInput(BaseModel):
     filename: Optional[str] = None
@@ -78,27 +199,73 @@ def smart_command_expand(user_input, choices):
     return user_input
 
 @app.post("/start_new_run")
-async def start_new_run_endpoint(input: StartRunInput):
+async def start_new_run_endpoint(input: StartRunInput, session_id: str = Depends(get_session_id)):
     print("start_new_run_endpoint called")
-    message = story_engine.start_new_run(input.seed)
+    return await engine_pool.run_for(session_id, start_new_run, input, session_id)
+
+def start_new_run(input: StartRunInput, session_id: str) -> Dict[str, str]:
+    try:
+        version, story_engine = sessions.fresh(session_id, input.content_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown content '{input.content_id}'")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Content '{input.content_id}' is invalid: {e}")
+    if content.resolve(input.content_id) != content.default_id:
+        message = story_engine.start_new_run(input.seed, world_size=input.world_size)
+    else:
+        blueprint = world_pool.acquire(input.seed, input.world_size)
+        if blueprint.get("templates_version") == story_engine.template_version:
+            message = story_engine.start_from_blueprint(blueprint)
+        else:
+            # The templates were swapped while this world was being taken from the pool.
+            message = story_engine.start_new_run(blueprint["seed"], world_size=input.world_size)
     # Store player info in game state if provided
     if input.name is not None:
         story_engine.game_state.player_name = input.name
     if input.chosenClass is not None:
         story_engine.game_state.player_class = input.chosenClass
+    try:
+        sessions.save(session_id, story_engine, version)
+    except VersionConflict:
+        raise version_conflict(session_id)
+    autosave.mark_dirty(session_id, story_engine)
     return {"message": message}
 
 @app.get("/scene")
-async def get_scene_endpoint() -> Dict[str, Any]:
+async def get_scene_endpoint(session_id: str = Depends(get_session_id)) -> Dict[str, Any]:
+    return await engine_pool.run_for(session_id, get_scene, session_id)
+
+def get_scene(session_id: str) -> Dict[str, Any]:
     try:
+        version, story_engine = sessions.load(session_id)
+        run = story_engine.current_run
+        seen = (run.visited_scenes, run.location_history) if run else None
         scene_data = story_engine.get_current_scene_data()
+        # Showing the scene only records the visit, which is usually known
+        # already; the persistent fields stay the same objects when it is.
+        if run and (run.visited_scenes is not seen[0] or run.location_history is not seen[1]):
+            sessions.save(session_id, story_engine, version)
         return scene_data
+    except VersionConflict:
+        raise version_conflict(session_id)
+    except TemplateVersionUnavailable as e:
+        raise templates_unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/command")
-async def process_command_endpoint(command: Dict[str, str]) -> Dict[str, str]:
+async def process_command_endpoint(command: Dict[str, str], session_id: str = Depends(get_session_id),
+                                   rate_key: str = Depends(get_rate_key)) -> Dict[str, Any]:
+    """Runs a command. With "include": "scene" the response carries the resulting
+    scene, and with "include": "diff" only the scene fields the command changed."""
+    wait = command_limiter.admit(rate_key)
+    if wait:
+        raise too_many_requests(wait)
+    return await engine_pool.run_for(session_id, process_command, command, session_id)
+
+def process_command(command: Dict[str, str], session_id: str) -> Dict[str, Any]:
     try:
+        version, story_engine = sessions.load(session_id)
         command_text = command["command"].strip()
         end_convo_keywords = ['bye', 'goodbye', 'leave', 'exit', 'end', 'farewell']
         scene_data = story_engine.get_current_scene_data()
@@ -107,6 +274,8 @@ async def process_command_endpoint(command: Dict[str, str]) -> Dict[str, str]:
         choices_lower = [c.lower() for c in choices]
         if story_engine.game_state.current_conversation and user_input in end_convo_keywords:
             expanded_command = command_text
+        elif user_input.split(" ", 1)[0] in HISTORY_VERBS:
+            expanded_command = command_text
         else:
             if user_input in choices_lower:
                 expanded_command = choices[choices_lower.index(user_input)]
@@ -126,71 +295,119 @@ async def process_command_endpoint(command: Dict[str, str]) -> Dict[str, str]:
                     if matches:
                         expanded_command = choices[choices_lower.index(matches[0])]
                         found = True
+                if not found:
+                    expanded_command = command_text
                 if not found and choices:
-                    HUGGINGFACE_API_TOKEN = os.environ.get("HF_API_TOKEN")
-                    MODEL = "facebook/bart-large-mnli"
-                    headers = {"Authorization": f"Bearer {HUGGINGFACE_API_TOKEN}"}
-                    payload = {
-                        "inputs": command_text,
-                        "parameters": {
-                            "candidate_labels": choices
-                        }
-                    }
-                    response = requests.post(
-                        f"https://api-inference.huggingface.co/models/{MODEL}",
-                        headers=headers,
-                        json=payload
-                    )
-                    result = response.json()
-                    if 'labels' in result and 'scores' in result and result['scores'][0] > 0.7:
-                        expanded_command = result['labels'][0]
-                    else:
-                        expanded_command = command_text
+                    with classifier_pool.slot() as admitted:
+                        # Under overload the command is passed on as typed
+                        # rather than queueing for the classifier.
+                        if admitted:
+                            HUGGINGFACE_API_TOKEN = os.environ.get("HF_API_TOKEN")
+                            MODEL = "facebook/bart-large-mnli"
+                            headers = {"Authorization": f"Bearer {HUGGINGFACE_API_TOKEN}"}
+                            payload = {
+                                "inputs": command_text,
+                                "parameters": {
+                                    "candidate_labels": choices
+                                }
+                            }
+                            try:
+                                response = requests.post(
+                                    f"https://api-inference.huggingface.co/models/{MODEL}",
+                                    headers=headers,
+                                    json=payload,
+                                    timeout=CLASSIFIER_TIMEOUT
+                                )
+                                result = response.json()
+                            except (requests.RequestException, ValueError) as e:
+                                print(f"Classifier unavailable, using the command as typed: {e}")
+                                result = {}
+                            if 'labels' in result and 'scores' in result and result['scores'][0] > 0.7:
+                                expanded_command = result['labels'][0]
         print(f"[{__import__('datetime').datetime.now()}] User input: '{command_text}' | Expanded to: '{expanded_command}'")
+        if story_engine.current_run and expanded_command in choices:
+            suggestions.observe(story_engine.current_run.location_history, expanded_command)
         if story_engine.game_state.current_conversation:
             result = story_engine.process_command(expanded_command)
             if story_engine.game_state.current_conversation:
-                conversation_status = f" (Still talking to {story_engine.game_state.current_conversation.title()})"
+                result += f" (Still talking to {story_engine.game_state.current_conversation.title()})"
             else:
-                conversation_status = " (Conversation ended)"
-            return {"result": result + conversation_status}
+                result += " (Conversation ended)"
         else:
             result = story_engine.process_command(expanded_command)
             if story_engine.game_state.current_conversation:
                 result += f" (Now talking to {story_engine.game_state.current_conversation.title()})"
-            return {"result": result}
+        response = {"result": result}
+        include = command.get("include")
+        if include in ("scene", "diff"):
+            new_scene = story_engine.get_current_scene_data()
+            if include == "scene":
+                response["scene"] = new_scene
+            else:
+                response["changes"] = scene_diff(scene_data, new_scene)
+        sessions.save(session_id, story_engine, version)
+        autosave.mark_dirty(session_id, story_engine)
+        return response
+    except VersionConflict:
+        raise version_conflict(session_id)
+    except TemplateVersionUnavailable as e:
+        raise templates_unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/save")
-async def save_game_endpoint(save_input: SaveGameInput = SaveGameInput()) -> Dict[str, str]:
+async def save_game_endpoint(save_input: SaveGameInput = SaveGameInput(), session_id: str = Depends(get_session_id)) -> Dict[str, str]:
+    return await engine_pool.run_for(session_id, save_game, save_input, session_id)
+
+def save_game(save_input: SaveGameInput, session_id: str) -> Dict[str, str]:
     try:
+        version, story_engine = sessions.load(session_id)
         result = story_engine.save_run(save_input.filename)
         return {"status": "success", "message": result}
+    except TemplateVersionUnavailable as e:
+        raise templates_unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/load")
-async def load_game_endpoint(load_input: LoadGameInput) -> Dict[str, Any]:
+async def load_game_endpoint(load_input: LoadGameInput, session_id: str = Depends(get_session_id)) -> Dict[str, Any]:
+    return await engine_pool.run_for(session_id, load_game, load_input, session_id)
+
+def load_game(load_input: LoadGameInput, session_id: str) -> Dict[str, Any]:
     try:
+        version, story_engine = sessions.load(session_id)
         result = story_engine.load_run(load_input.filename)
         response = story_engine.get_current_scene_data()
         response['message'] = result
+        sessions.save(session_id, story_engine, version)
+        autosave.mark_dirty(session_id, story_engine)
         return response
+    except VersionConflict:
+        raise version_conflict(session_id)
+    except TemplateVersionUnavailable as e:
+        raise templates_unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/saves")
-async def list_saves_endpoint() -> Dict[str, List[str]]:
+async def list_saves_endpoint(session_id: str = Depends(get_session_id)) -> Dict[str, List[str]]:
     try:
-        saves = story_engine.list_saves()
+        saves = await engine_pool.run(template_engine.list_saves)
+        # The session's own autosave can be loaded like any other save.
+        path = autosave.path_for(session_id)
+        if await engine_pool.run(os.path.exists, path):
+            saves.append(path)
         return {"saves": saves}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/status")
-async def get_status() -> Dict[str, Any]:
+async def get_status(session_id: str = Depends(get_session_id)) -> Dict[str, Any]:
+    return await engine_pool.run_for(session_id, status, session_id)
+
+def status(session_id: str) -> Dict[str, Any]:
     try:
+        version, story_engine = sessions.load(session_id)
         if not story_engine.current_run:
             return {"status": "no_active_run", "message": "No active run. Start a new run first."}
         return {
@@ -198,18 +415,26 @@ async def get_status() -> Dict[str, Any]:
             "seed": story_engine.current_run.seed,
             "current_location": story_engine.game_state.location,
             "visited_scenes": len(story_engine.current_run.visited_scenes),
-            "inventory_count": len(story_engine.game_state.inventory)
+            "inventory_count": len(story_engine.game_state.inventory),
+            "autosave": autosave.path_for(session_id)
         }
+    except TemplateVersionUnavailable as e:
+        raise templates_unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/inventory")
-async def get_inventory() -> Dict[str, Any]:
+async def get_inventory(session_id: str = Depends(get_session_id)) -> Dict[str, Any]:
+    return await engine_pool.run_for(session_id, inventory, session_id)
+
+def inventory(session_id: str) -> Dict[str, Any]:
     try:
+        version, story_engine = sessions.load(session_id)
         if not story_engine.current_run:
             raise HTTPException(status_code=400, detail="No active run")
         inventory_details = []
-        for item_name, item in story_engine.game_state.inventory.items():
+        game_state = story_engine.game_state.to_model()
+        for item_name, item in game_state.inventory.items():
             inventory_details.append({
                 "name": item.name,
                 "description": item.description,
@@ -219,11 +444,72 @@ async def get_inventory() -> Dict[str, Any]:
             "inventory": inventory_details,
             "count": len(inventory_details)
         }
+    except TemplateVersionUnavailable as e:
+        raise templates_unavailable(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/quests")
+async def get_quests(session_id: str = Depends(get_session_id)) -> Dict[str, Any]:
+    return await engine_pool.run_for(session_id, quests, session_id)
+
+def quests(session_id: str) -> Dict[str, Any]:
+    try:
+        version, story_engine = sessions.load(session_id)
+        if not story_engine.current_run:
+            raise HTTPException(status_code=400, detail="No active run")
+        return story_engine.current_run.quests.describe()
+    except HTTPException:
+        raise
+    except TemplateVersionUnavailable as e:
+        raise templates_unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/suggest")
+async def suggest_next_move(k: int = 3, session_id: str = Depends(get_session_id)) -> Dict[str, Any]:
+    return await engine_pool.run_for(session_id, suggest_next, k, session_id)
+
+def suggest_next(k: int, session_id: str) -> Dict[str, Any]:
+    try:
+        version, story_engine = sessions.load(session_id)
+        if not story_engine.current_run:
+            raise HTTPException(status_code=400, detail="No active run")
+        scene_data = story_engine.get_current_scene_data()
+        return {"suggestions": suggestions.suggest(story_engine.current_run.location_history, scene_data["choices"], k)}
+    except HTTPException:
+        raise
+    except TemplateVersionUnavailable as e:
+        raise templates_unavailable(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/content")
+async def list_content() -> Dict[str, Any]:
+    return {"content": content.available(), "default": content.default_id, "stories": sorted(content.stories)}
+
+@app.get("/metrics")
+async def get_metrics() -> Dict[str, Any]:
+    return {
+        "sessions": sessions.stats(),
+        "world_pool": world_pool.stats(),
+        "content": content.stats(),
+        "admission": {
+            "commands": command_limiter.stats(),
+            "intents": intent_limiter.stats(),
+            "classifier": classifier_pool.stats(),
+            "generation": generation_pool.stats()
+        },
+        "autosave": autosave.stats(),
+        "engine_pool": engine_pool.stats(),
+        "suggestions": suggestions.stats()
+    }
+
 @app.post("/intent")
-async def classify_intent(req: IntentRequest):
+async def classify_intent(req: IntentRequest, rate_key: str = Depends(get_rate_key)):
+    wait = intent_limiter.admit(rate_key)
+    if wait:
+        raise too_many_requests(wait)
     HUGGINGFACE_API_TOKEN = os.environ.get("HF_API_TOKEN")
     MODEL = "facebook/bart-large-mnli"
     candidate_labels = ["move", "pickup", "talk", "inventory", "save", "load", "explore", "backtrack", "quit", "help"]
@@ -234,11 +520,17 @@ async def classify_intent(req: IntentRequest):
             "candidate_labels": candidate_labels
         }
     }
-    response = requests.post(
-        f"https://api-inference.huggingface.co/models/{MODEL}",
-        headers=headers,
-        json=payload
-    )
+    with classifier_pool.slot() as admitted:
+        if not admitted:
+            # There is no local fallback for a bare intent, so ask the client to come back.
+            raise too_many_requests(1)
+        response = await engine_pool.run(
+            requests.post,
+            f"https://api-inference.huggingface.co/models/{MODEL}",
+            headers=headers,
+            json=payload,
+            timeout=CLASSIFIER_TIMEOUT
+        )
     result = response.json()
     intent = result['labels'][0] if 'labels' in result else "unknown"
     return {"intent": intent}
@@ -256,7 +548,11 @@ async def root():
             "/load",
             "/saves",
             "/status",
-            "/inventory"
+            "/inventory",
+            "/quests",
+            "/suggest",
+            "/content",
+            "/metrics"
         ]
     }
 
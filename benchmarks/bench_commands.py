@@ -0,0 +1,66 @@
+# benchmarks/bench_commands.py
+#
+# Shows that a command stays flat as the number of registered verbs and the
+# number of items in a scene grow. A real engine runs "take" through
+# process_command in a scene holding the extra items. Run from the
+# repository root:
+#
+#   python -m benchmarks.bench_commands --counts 0 100 10000
+
+import argparse
+import time
+from core.commands import NameIndex
+from core.proceduralEngine import ProceduralStoryEngine
+from core.runtime import RuntimeItem
+
+def bench_engine(templates: dict, count: int) -> ProceduralStoryEngine:
+    """Returns an engine with `count` extra verbs, in a run whose current scene holds `count` extra items."""
+    registry = ProceduralStoryEngine.commands.copy()
+    for i in range(count):
+        registry.register(f"bench verb {i}")(lambda engine, argument: "")
+    engine_class = type("BenchEngine", (ProceduralStoryEngine,), {"commands": registry})
+    engine = engine_class(templates=templates)
+    engine.start_new_run("bench")
+    run = engine.current_run
+    location = engine.game_state.location
+    items = [RuntimeItem(None, {"name": f"Bench Item {i}", "description": "", "properties": {}}) for i in range(count)]
+    run.spawned_base[location] = run.spawned_base[location] + tuple(items)
+    run.spawned_items[location] = NameIndex(run.spawned_base[location])
+    return engine
+
+def time_take(templates: dict, count: int, commands: int) -> float:
+    """Times taking an item from a scene holding `count` other items.
+
+    The item is put back between commands, outside the timed region, so
+    every command sees the same scene.
+    """
+    engine = bench_engine(templates, count)
+    item_id, template = next(iter(templates["items"].items()))
+    item = RuntimeItem(item_id, template)
+    command = f"take {item.name.lower()}"
+    run = engine.current_run
+    items = run.spawned_items[engine.game_state.location]
+    inventory, removed = engine.game_state.inventory, run.removed_items
+    elapsed = 0.0
+    for _ in range(commands):
+        items.add(item)
+        start = time.perf_counter()
+        engine.process_command(command)
+        elapsed += time.perf_counter() - start
+        engine.game_state.inventory, run.removed_items = inventory, removed
+    return elapsed / commands
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark commands against verb and item counts.")
+    parser.add_argument("--templates", default="templates.json")
+    parser.add_argument("--counts", type=int, nargs="+", default=[0, 100, 10000])
+    parser.add_argument("--commands", type=int, default=20000)
+    args = parser.parse_args()
+
+    templates = ProceduralStoryEngine(templates_file=args.templates).templates
+    for count in args.counts:
+        per_command = time_take(templates, count, args.commands)
+        print(f"{count:6d} verbs and items: {per_command * 1e6:7.2f} us/command")
+
+if __name__ == "__main__":
+    main()
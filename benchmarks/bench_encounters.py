@@ -0,0 +1,58 @@
+# benchmarks/bench_encounters.py
+#
+# Shows that the cost of a move stays flat as the number of encounter
+# templates grows. Run from the repository root:
+#
+#   python -m benchmarks.bench_encounters --counts 0 10 100 1000 10000
+
+import argparse
+import copy
+import time
+from core.proceduralEngine import ProceduralStoryEngine
+
+LOCATION_TYPES = ["forest", "cave", "mountain", "village", "river", "lake", "temple", "mine"]
+
+def with_encounters(templates: dict, count: int) -> dict:
+    """Returns a copy of the templates with `count` synthetic encounters added."""
+    templates = copy.deepcopy(templates)
+    encounters = templates.setdefault("encounters", {})
+    for i in range(count):
+        encounters[f"bench_{i}"] = {
+            "name": f"Bench Encounter {i}",
+            "description": "Something happens.",
+            "type": "environmental",
+            "difficulty": 1 + i % 4,
+            "conditions": {"location_types": [LOCATION_TYPES[i % len(LOCATION_TYPES)]], "probability": 0.2 / (1 + count)}
+        }
+    return templates
+
+def time_moves(engine: ProceduralStoryEngine, moves: int) -> float:
+    engine.start_new_run("bench")
+    start = time.perf_counter()
+    for i in range(moves):
+        engine.process_command("go north" if i % 2 == 0 else "go south")
+    return (time.perf_counter() - start) / moves
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-move encounter overhead.")
+    parser.add_argument("--templates", default="templates.json")
+    parser.add_argument("--counts", type=int, nargs="+", default=[0, 10, 100, 1000, 10000])
+    parser.add_argument("--moves", type=int, default=20000)
+    args = parser.parse_args()
+
+    base = ProceduralStoryEngine(templates_file=args.templates).templates
+    disabled = copy.deepcopy(base)
+    disabled["game_settings"]["random_events"] = False
+    baseline = time_moves(ProceduralStoryEngine(templates=disabled), args.moves)
+    print(f"random_events off:      {baseline * 1e6:7.2f} us/move")
+    for count in args.counts:
+        templates = with_encounters(base, count)
+        start = time.perf_counter()
+        engine = ProceduralStoryEngine(templates=templates)
+        compile_time = time.perf_counter() - start
+        per_move = time_moves(engine, args.moves)
+        print(f"{len(templates['encounters']):6d} encounters:     {per_move * 1e6:7.2f} us/move  "
+              f"(+{(per_move - baseline) * 1e6:5.2f} us, compiled in {compile_time * 1e3:.1f} ms)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# benchmarks/bench_load.py
+#
+# Load test of the API under mixed command and save traffic. Players run
+# concurrently against the app in-process, each sending commands and saving
+# every few moves, while a probe measures how late the event loop wakes up.
+# Some players explore a much larger world, whose region loads make their
+# commands slow. Reports latency percentiles per endpoint for both kinds of
+# player. Compare the engine pool with the old inline behaviour from the
+# repository root:
+#
+#   python -m benchmarks.bench_load --players 32 --seconds 20 --workers 8
+#   python -m benchmarks.bench_load --players 32 --seconds 20 --workers 0
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+async def player(client, session_id: str, world_size: int, label: str, args, deadline: float,
+                 latencies: Dict[str, List[float]]):
+    rng = random.Random(session_id)
+    headers = {"X-Session-Id": session_id}
+    await client.post("/start_new_run", json={"seed": session_id, "world_size": world_size}, headers=headers)
+    choices = (await client.get("/scene", headers=headers)).json()["choices"]
+    step = 0
+    while time.perf_counter() < deadline:
+        step += 1
+        start = time.perf_counter()
+        if step % args.save_every == 0:
+            endpoint = "/save"
+            await client.post(endpoint, json={"filename": f"save_{session_id}.json"}, headers=headers)
+        else:
+            endpoint = "/command"
+            response = await client.post(endpoint, json={"command": rng.choice(choices), "include": "scene"}, headers=headers)
+            choices = response.json()["scene"]["choices"] or ["inventory"]
+        latencies.setdefault(endpoint + label, []).append(time.perf_counter() - start)
+
+async def probe(deadline: float, lags: List[float], interval: float = 0.01):
+    """Records how much later than asked the event loop resumes a sleeping task."""
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+async def run(args):
+    import httpx
+    import api
+    os.chdir(tempfile.mkdtemp(prefix="bench-load-"))
+    latencies: Dict[str, List[float]] = {}
+    lags: List[float] = []
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        deadline = time.perf_counter() + args.seconds
+        await asyncio.gather(
+            probe(deadline, lags),
+            *(player(client, f"player{i}", args.world_size, "", args, deadline, latencies)
+              for i in range(args.players)),
+            *(player(client, f"explorer{i}", args.large_world_size, " (large)", args, deadline, latencies)
+              for i in range(args.large_players))
+        )
+    print(f"workers: {args.workers}, players: {args.players} in {args.world_size}x{args.world_size} worlds, "
+          f"{args.large_players} in {args.large_world_size}x{args.large_world_size}")
+    print(f"{'':18} {'count':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, values in sorted(latencies.items()) + [("loop lag", lags)]:
+        print(f"{name:18} {len(values):7d} " + " ".join(
+            f"{percentile(values, fraction) * 1000:8.1f}" for fraction in (0.5, 0.95, 0.99, 1.0)))
+    print(f"engine pool: {api.engine_pool.stats()}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the API with concurrent command and save traffic.")
+    parser.add_argument("--players", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--workers", type=int, default=8, help="engine pool threads; 0 runs engine work on the event loop")
+    parser.add_argument("--world_size", type=int, default=16)
+    parser.add_argument("--large_players", type=int, default=4)
+    parser.add_argument("--large_world_size", type=int, default=512)
+    parser.add_argument("--session_store", default=None, help="SESSION_STORE for the app, e.g. sqlite:///sessions.db")
+    parser.add_argument("--save_every", type=int, default=5, help="one save per this many requests")
+    args = parser.parse_args()
+    # Configure the app before it is imported.
+    os.environ["ENGINE_WORKERS"] = str(args.workers)
+    if args.session_store:
+        os.environ["SESSION_STORE"] = args.session_store
+    for name in ("COMMAND_RATE", "COMMAND_BURST", "GLOBAL_COMMAND_RATE", "GLOBAL_COMMAND_BURST"):
+        os.environ.setdefault(name, "1000000")
+    os.environ.setdefault("AUTOSAVE_DIR", tempfile.mkdtemp(prefix="bench-autosave-"))
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# benchmarks/bench_quests.py
+#
+# Shows that the cost of a command stays flat as the number of active quests
+# per player grows, both for quests waiting on other targets and, with
+# --untargeted, for quests that any event of their kind advances.
+# Run from the repository root:
+#
+#   python -m benchmarks.bench_quests --counts 0 10 100 1000 10000
+#   python -m benchmarks.bench_quests --counts 0 10 100 1000 --untargeted
+
+import argparse
+import copy
+import time
+from core.proceduralEngine import ProceduralStoryEngine
+
+COMMANDS = ["go north", "go south", "talk to forest guardian", "bye"]
+
+def with_quests(templates: dict, count: int, untargeted: bool = False) -> dict:
+    """Returns a copy of the templates with `count` quests, each waiting on its own event.
+
+    The targets are places and people the benchmark never reaches, so the
+    timings show the cost of the quests a command does not affect, which
+    is what grows with the number of active quests in a naive tracker.
+    Untargeted quests wait on any location and need more visits than the
+    benchmark makes, so they stay active but are visited on every move.
+    """
+    templates = copy.deepcopy(templates)
+    for i in range(count):
+        wander = {"text": "Wander", "event": "location_entered", "target": f"bench_location_{i}"}
+        if untargeted:
+            wander = {"text": "Wander", "event": "location_entered", "target": None, "count": 10 ** 9}
+        templates["quests"][f"bench_{i}"] = {
+            "title": f"Bench Quest {i}",
+            "description": "",
+            "objectives": [
+                wander,
+                {"text": "Chat", "event": "npc_talked", "target": f"bench_npc_{i}"}
+            ],
+            "rewards": []
+        }
+    return templates
+
+def time_commands(templates: dict, count: int, commands: int) -> float:
+    engine = ProceduralStoryEngine(templates=templates)
+    engine.start_new_run("bench")
+    for i in range(count):
+        engine.current_run.quests.start(f"bench_{i}")
+    start = time.perf_counter()
+    for i in range(commands):
+        engine.process_command(COMMANDS[i % len(COMMANDS)])
+    return (time.perf_counter() - start) / commands
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-command quest tracking overhead.")
+    parser.add_argument("--templates", default="templates.json")
+    parser.add_argument("--counts", type=int, nargs="+", default=[0, 10, 100, 1000])
+    parser.add_argument("--commands", type=int, default=20000)
+    parser.add_argument("--untargeted", action="store_true", help="quests wait on any location instead of their own")
+    args = parser.parse_args()
+
+    base = ProceduralStoryEngine(templates_file=args.templates).templates
+    for count in args.counts:
+        per_command = time_commands(with_quests(base, count, args.untargeted), count, args.commands)
+        print(f"{count:6d} active quests: {per_command * 1e6:7.2f} us/command")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# benchmarks/bench_runtime.py
+#
+# Reports time and allocations per start_new_run and per command for the
+# procedural engine. Run from the repository root:
+#
+#   python -m benchmarks.bench_runtime --runs 200 --commands 2000
+
+import argparse
+import time
+import tracemalloc
+from core.proceduralEngine import ProceduralStoryEngine
+
+COMMANDS = ["take rusty key", "talk to forest guardian", "bye", "inventory", "go north", "go south"]
+
+def measure(fn, repeat: int):
+    """Returns (seconds per call, peak bytes allocated per call, bytes retained per call)."""
+    start = time.perf_counter()
+    for i in range(repeat):
+        fn(i)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    peak_total = 0
+    for i in range(repeat):
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        fn(i)
+        peak_total += tracemalloc.get_traced_memory()[1] - current
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return elapsed / repeat, peak_total / repeat, retained / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the procedural engine runtime state.")
+    parser.add_argument("--templates", default="templates.json")
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--commands", type=int, default=2000)
+    args = parser.parse_args()
+
+    engine = ProceduralStoryEngine(templates_file=args.templates)
+
+    t, peak, retained = measure(lambda i: engine.start_new_run(f"bench{i}"), args.runs)
+    print(f"start_new_run: {t * 1e6:9.1f} us/run  {peak / 1024:8.1f} KiB allocated/run  {retained:8.1f} B retained/run")
+
+    engine.start_new_run("bench")
+    def command(i):
+        engine.process_command(COMMANDS[i % len(COMMANDS)])
+        engine.get_current_scene_data()
+    t, peak, retained = measure(command, args.commands)
+    print(f"command:       {t * 1e6:9.1f} us/cmd  {peak / 1024:8.1f} KiB allocated/cmd  {retained:8.1f} B retained/cmd")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# benchmarks/bench_snapshots.py
+#
+# Measures the cost of taking and restoring run snapshots on a long random
+# playthrough of a synthesized world, and the memory the snapshots retain
+# beyond the run itself. Run from the repository root:
+#
+#   python -m benchmarks.bench_snapshots --commands 5000 --world_size 64
+
+import argparse
+import random
+import time
+import tracemalloc
+from core.proceduralEngine import ProceduralStoryEngine
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark run snapshots, restores and their memory.")
+    parser.add_argument("--templates", default="templates.json")
+    parser.add_argument("--commands", type=int, default=5000)
+    parser.add_argument("--world_size", type=int, default=64)
+    parser.add_argument("--restores", type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    engine = ProceduralStoryEngine(templates_file=args.templates)
+    engine.start_new_run("bench", world_size=args.world_size, region_size=8)
+
+    tracemalloc.start()
+    snapshots = []
+    snapshot_seconds = 0.0
+    for _ in range(args.commands):
+        choices = engine.get_current_scene_data()["choices"]
+        start = time.perf_counter()
+        snapshots.append(engine.snapshot())
+        snapshot_seconds += time.perf_counter() - start
+        engine.process_command(rng.choice(choices) if choices else "inventory")
+    engine.current_run.undo.clear()
+    run = engine.current_run
+    visited = len(run.visited_scenes)
+    taken = sum(len(names) for _, names in run.removed_items.items())
+
+    # Stepping back through the playthrough, as repeated undo does.
+    restores = min(args.restores, len(snapshots))
+    start = time.perf_counter()
+    for snapshot in reversed(snapshots[-restores:]):
+        engine.restore(snapshot)
+    undo_seconds = time.perf_counter() - start
+
+    # Jumping between far apart points, which also streams regions back in.
+    start = time.perf_counter()
+    for snapshot in rng.sample(snapshots, restores):
+        engine.restore(snapshot)
+    jump_seconds = time.perf_counter() - start
+
+    with_snapshots = tracemalloc.get_traced_memory()[0]
+    count = len(snapshots)
+    del snapshots
+    retained = with_snapshots - tracemalloc.get_traced_memory()[0]
+
+    # Snapshots with nothing changed in between share everything but themselves.
+    before = tracemalloc.get_traced_memory()[0]
+    unchanged = [engine.snapshot() for _ in range(count)]
+    unchanged_bytes = tracemalloc.get_traced_memory()[0] - before
+    del unchanged
+    tracemalloc.stop()
+
+    print(f"snapshots: {count} ({visited} visited locations, {taken} items taken at the end)")
+    print(f"snapshot: {snapshot_seconds / count * 1e6:8.1f} us")
+    print(f"undo:     {undo_seconds / restores * 1e6:8.1f} us per step back")
+    print(f"jump:     {jump_seconds / restores * 1e6:8.1f} us per restore in random order")
+    print(f"memory:   {retained / count:8.0f} bytes per snapshot, one command apart")
+    print(f"          {unchanged_bytes / count:8.0f} bytes per snapshot with no change in between")
+
+if __name__ == "__main__":
+    main()
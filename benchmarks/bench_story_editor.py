@@ -0,0 +1,51 @@
+# benchmarks/bench_story_editor.py
+#
+# Times a bulk import through story_editor.py's batch mode: N new scenes,
+# each with an item and two choices, applied to story.json and optionally
+# mirrored to an indexed store. Run from the repository root:
+#
+#   python -m benchmarks.bench_story_editor --scenes 10000 --store
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from story_editor import run_batch
+
+def write_patches(path: str, count: int):
+    with open(path, 'w') as f:
+        for i in range(count):
+            scene = {
+                "id": f"bench_{i}",
+                "descriptions": [{"text": f"Bench scene {i}."}],
+                "items": [{"name": f"pebble {i}", "description": "A small pebble.", "properties": {}}],
+                "choices": [
+                    {"action": "go north", "next_scene": f"bench_{(i + 1) % count}"},
+                    {"action": "go south", "next_scene": f"bench_{(i - 1) % count}"}
+                ],
+                "flags": []
+            }
+            f.write(json.dumps({"op": "add_scene", "scene": scene}) + "\n")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bulk scene imports through story_editor batch mode.")
+    parser.add_argument("--story", default="story.json")
+    parser.add_argument("--scenes", type=int, default=10000)
+    parser.add_argument("--store", action="store_true", help="Also write the indexed SQLite store.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        story = os.path.join(directory, "story.json")
+        patches = os.path.join(directory, "patches.jsonl")
+        store = os.path.join(directory, "story.db") if args.store else None
+        shutil.copy(args.story, story)
+        write_patches(patches, args.scenes)
+        start = time.perf_counter()
+        run_batch(patches, story, store)
+        elapsed = time.perf_counter() - start
+        print(f"{args.scenes} scenes imported in {elapsed:.2f}s ({elapsed / args.scenes * 1e6:.1f} us/scene)")
+
+if __name__ == "__main__":
+    main()
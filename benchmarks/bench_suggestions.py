@@ -0,0 +1,58 @@
+# benchmarks/bench_suggestions.py
+#
+# Measures update and query throughput of the suggestion index on random
+# walks over the template map, and shows the context count staying within
+# its limit. Run from the repository root:
+#
+#   python -m benchmarks.bench_suggestions --updates 200000 --max_contexts 5000
+
+import argparse
+import random
+import time
+from core.proceduralEngine import ProceduralStoryEngine
+from core.suggestions import SuggestionIndex
+
+def walks(templates: dict, count: int, rng: random.Random):
+    """Yields (history, choices, picked) for `count` steps of random walks over the template map."""
+    locations = templates["locations"]
+    history = [templates["game_settings"]["starting_location"]]
+    for _ in range(count):
+        current = locations[history[-1]]
+        connections = current.get("connections", {})
+        choices = [f"go {direction}" for direction in connections] + [f"take {item}" for item in current.get("items", [])]
+        if not choices:
+            history = [templates["game_settings"]["starting_location"]]
+            continue
+        picked = rng.choice(choices)
+        yield history[-10:], choices, picked
+        if picked.startswith("go "):
+            history.append(connections[picked[3:]])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark suggestion index updates and queries.")
+    parser.add_argument("--templates", default="templates.json")
+    parser.add_argument("--updates", type=int, default=200000)
+    parser.add_argument("--max_contexts", type=int, default=50000)
+    parser.add_argument("--order", type=int, default=3)
+    args = parser.parse_args()
+
+    templates = ProceduralStoryEngine(templates_file=args.templates).templates
+    steps = list(walks(templates, args.updates, random.Random(0)))
+    index = SuggestionIndex(order=args.order, max_contexts=args.max_contexts)
+
+    start = time.perf_counter()
+    for history, choices, picked in steps:
+        index.observe(history, picked)
+    update_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for history, choices, picked in steps:
+        index.suggest(history, choices)
+    query_seconds = time.perf_counter() - start
+
+    print(f"updates: {len(steps) / update_seconds:10.0f}/s")
+    print(f"queries: {len(steps) / query_seconds:10.0f}/s")
+    print(f"contexts: {index.stats()['contexts']} (limit {args.max_contexts}, pruned {index.pruned})")
+
+if __name__ == "__main__":
+    main()
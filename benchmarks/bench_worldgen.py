@@ -0,0 +1,56 @@
+# benchmarks/bench_worldgen.py
+#
+# Measures synthesized world generation throughput and per-run memory as the
+# world grows. Run from the repository root:
+#
+#   python -m benchmarks.bench_worldgen --sizes 64 256 1024 --steps 200
+
+import argparse
+import random
+import time
+import tracemalloc
+from core.proceduralEngine import ProceduralStoryEngine
+from core.worldSynth import WorldSynthesizer
+
+def region_throughput(templates: dict, size: int, regions: int) -> float:
+    """Returns generated locations per second over `regions` region builds."""
+    world = WorldSynthesizer(templates, "bench", size)
+    per_side = (size + world.region_size - 1) // world.region_size
+    keys = [(i % per_side, (i // per_side) % per_side) for i in range(regions)]
+    count = 0
+    start = time.perf_counter()
+    for key in keys:
+        count += len(world.generate_region(*key).locations)
+    return count / (time.perf_counter() - start)
+
+def walk_memory(engine: ProceduralStoryEngine, size: int, steps: int) -> tuple:
+    """Starts a run, walks randomly and returns (KiB held by the run, locations in memory)."""
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    engine.start_new_run("bench", world_size=size)
+    rng = random.Random(0)
+    for _ in range(steps):
+        direction = rng.choice(list(engine.current_run.scene_connections[engine.game_state.location]))
+        engine.process_command(f"go {direction}")
+        engine.get_current_scene_data()
+    held = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return held / 1024, len(engine.current_run.locations)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark synthesized world generation.")
+    parser.add_argument("--templates", default="templates.json")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[64, 256, 1024])
+    parser.add_argument("--regions", type=int, default=50)
+    parser.add_argument("--steps", type=int, default=200)
+    args = parser.parse_args()
+
+    engine = ProceduralStoryEngine(templates_file=args.templates)
+    for size in args.sizes:
+        rate = region_throughput(engine.templates, size, args.regions)
+        held, loaded = walk_memory(engine, size, args.steps)
+        print(f"{size:5d}x{size:<5d} ({size * size:>9,d} locations): "
+              f"{rate:10,.0f} locations/s  {held:8.1f} KiB per run  {loaded:6d} locations loaded")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# benchmarks/check_session_stores.py
+#
+# Checks that session store backends keep the SessionStore contract: versions
+# start at 1 and go up by one per write, stale writes raise VersionConflict,
+# and of several workers racing on one session exactly one wins each version.
+# Also times reads and writes. Stores are given as SESSION_STORE URLs; the
+# Redis store runs against fakeredis by default (pip install -r
+# requirements-dev.txt), or a real server with redis://. Run from the
+# repository root:
+#
+#   python -m benchmarks.check_session_stores
+#   python -m benchmarks.check_session_stores --stores redis://localhost:6379/15
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+from core.sessionStore import SessionStore, VersionConflict, create_session_store
+
+def expect_conflict(store: SessionStore, session_id: str, data: bytes, expected_version: int):
+    try:
+        store.put(session_id, data, expected_version)
+    except VersionConflict:
+        return
+    raise AssertionError(f"put at stale version {expected_version} was accepted")
+
+def check_contract(store: SessionStore, session_id: str):
+    store.delete(session_id)
+    assert store.get(session_id) == (0, None), "unknown session is not at version 0"
+    assert store.put(session_id, b"first", 0) == 1
+    expect_conflict(store, session_id, b"again", 0)
+    assert store.put(session_id, b"second", 1) == 2
+    expect_conflict(store, session_id, b"stale", 1)
+    assert store.get(session_id) == (2, b"second"), f"read back {store.get(session_id)}"
+    assert store.version(session_id) == 2
+    store.delete(session_id)
+    assert store.version(session_id) == 0, "deleted session still has a version"
+
+def check_race(store: SessionStore, session_id: str, workers: int, attempts: int) -> int:
+    """Workers read, then write back on top of what they read. Returns the number of conflicts."""
+    store.delete(session_id)
+    wins = [0] * workers
+    conflicts = [0] * workers
+
+    def worker(index: int):
+        for _ in range(attempts):
+            version, _ = store.get(session_id)
+            try:
+                store.put(session_id, f"worker {index}".encode("utf-8"), version)
+                wins[index] += 1
+            except VersionConflict:
+                conflicts[index] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    version = store.version(session_id)
+    assert version == sum(wins), f"{sum(wins)} writes won but the session is at version {version}"
+    store.delete(session_id)
+    return sum(conflicts)
+
+def time_calls(store: SessionStore, session_id: str, calls: int, size: int):
+    data = b"x" * size
+    store.delete(session_id)
+    start = time.perf_counter()
+    for version in range(calls):
+        store.put(session_id, data, version)
+    put_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(calls):
+        store.get(session_id)
+    get_seconds = time.perf_counter() - start
+    store.delete(session_id)
+    return put_seconds / calls, get_seconds / calls
+
+def main():
+    parser = argparse.ArgumentParser(description="Check session store backends against the SessionStore contract.")
+    parser.add_argument("--stores", nargs="+", default=["memory", "sqlite", "fakeredis://"],
+                        help="SESSION_STORE URLs; 'sqlite' uses a temporary file")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--attempts", type=int, default=200)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--state_bytes", type=int, default=4096)
+    args = parser.parse_args()
+
+    failed = False
+    for label in args.stores:
+        url = label
+        if url == "sqlite":
+            url = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="check-stores-"), "sessions.db")
+        try:
+            store = create_session_store(url)
+        except ImportError as e:
+            print(f"{label:14} skipped: {e}")
+            continue
+        try:
+            check_contract(store, "check:contract")
+            conflicts = check_race(store, "check:race", args.workers, args.attempts)
+            put, get = time_calls(store, "check:timing", args.calls, args.state_bytes)
+        except AssertionError as e:
+            failed = True
+            print(f"{label:14} FAILED: {e}")
+            continue
+        print(f"{label:14} ok  race conflicts: {conflicts:5d}  put: {put * 1e6:7.1f} us  get: {get * 1e6:7.1f} us")
+    if failed:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
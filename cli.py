@@ -1,9 +1,11 @@
 from core.engine import StoryEngine
+from core.contentRegistry import ContentRegistry
 import argparse
 
-def run_cli(save_file):
+def run_cli(save_file, story_file="story.json"):
     """Runs the story engine in CLI mode."""
-    engine = StoryEngine(story_file="story.json")
+    content = ContentRegistry(default_id="story", stories={"story": story_file})
+    engine = StoryEngine(story=content.story())
     engine.load_game(save_file) # load on startup
     while True:
         scene_output = engine.get_scene_output()
@@ -22,6 +24,7 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run the Story Engine.")
     parser.add_argument("--mode", choices=["api", "cli"], default="api", help="Run in 'api' (FastAPI) or 'cli' mode.")
     parser.add_argument("--save_file", default="save.json", help="Save file for game state.") #new
+    parser.add_argument("--story", default="story.json", help="Story file to play in 'cli' mode.")
     args = parser.parse_args()
 
     if args.mode == "api":
@@ -29,4 +32,4 @@ if __name__ == "__main__":
         from api import app
         uvicorn.run(app, host="0.0.0.0", port=8000)
     elif args.mode == "cli":
-        run_cli(args.save_file)
+        run_cli(args.save_file, args.story)
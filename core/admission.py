@@ -0,0 +1,125 @@
+# core/admission.py
+#
+# Admission control for the API. Commands pass a per-session token bucket and
+# a global one before any work is done, and the expensive remote calls
+# (intent classification, text generation) run in small bounded pools that
+# refuse work instead of queueing it, so callers can fall back to something
+# cheaper while the server is overloaded.
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+class TokenBucket:
+    """Allows `rate` requests per second on average with bursts of up to `burst`."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, now: float) -> float:
+        """Takes a token. Returns 0 when admitted, otherwise the seconds until a token is available."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+class RateLimiter:
+    """Token buckets per session plus one shared by everybody.
+
+    Buckets of sessions that have not been seen for a while are dropped
+    once more than `max_sessions` are tracked; a dropped session simply
+    starts again with a full bucket.
+    """
+
+    def __init__(self, rate: float, burst: float, global_rate: float, global_burst: float, max_sessions: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_sessions = max_sessions
+        self._global = TokenBucket(global_rate, global_burst)
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.shed_session = 0
+        self.shed_global = 0
+
+    def admit(self, session_id: str) -> float:
+        """Returns 0 when the request may proceed, otherwise the seconds to wait before retrying."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(session_id)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst)
+                self._buckets[session_id] = bucket
+                if len(self._buckets) > self.max_sessions:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(session_id)
+            wait = bucket.take(now)
+            if wait:
+                self.shed_session += 1
+                return wait
+            wait = self._global.take(now)
+            if wait:
+                # The session's token was not used, so give it back.
+                bucket.tokens += 1
+                self.shed_global += 1
+                return wait
+            self.admitted += 1
+            return 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tracked_sessions": len(self._buckets),
+            "admitted": self.admitted,
+            "shed_session": self.shed_session,
+            "shed_global": self.shed_global
+        }
+
+class WorkPool:
+    """Caps how many calls of one kind run at once. Calls over the cap are refused, never queued."""
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self.in_use = 0
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.shed = 0
+
+    @contextmanager
+    def slot(self) -> Iterator[bool]:
+        """Yields True while holding a slot, or False (and counts a shed call) when the pool is full."""
+        with self._lock:
+            admitted = self.in_use < self.limit
+            if admitted:
+                self.in_use += 1
+                self.admitted += 1
+            else:
+                self.shed += 1
+        try:
+            yield admitted
+        finally:
+            if admitted:
+                with self._lock:
+                    self.in_use -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"limit": self.limit, "in_use": self.in_use, "admitted": self.admitted, "shed": self.shed}
+
+# Text generation shared by every StoryEngine in the process; the API sets
+# its limit from GENERATION_CONCURRENCY.
+generation_pool = WorkPool("generation", 1)
+
+def retry_after(seconds: float) -> str:
+    """Formats a wait for the Retry-After header, which only takes whole seconds."""
+    return str(max(1, math.ceil(min(seconds, 3600))))
@@ -0,0 +1,209 @@
+# core/autosave.py
+#
+# Background autosaving of runs. Requests only mark their session dirty; a
+# task on the event loop writes a save file once a session has seen
+# game_settings.autosave_frequency commands, and every `interval` seconds for
+# anything else still dirty. Marks made between two writes collapse into one
+# write of the latest state. Dirty sessions are flushed on shutdown, and
+# read() gives a session's last autosave back, so a session the store has
+# lost (a restart with the memory store) resumes from it.
+# Callbacks registered with on_flush run after every full flush, so other
+# state (the suggestion index) is saved on the same schedule.
+#
+# Requests may change engines on worker threads. Given the API's session
+# locks, a flush holds a session's lock while it snapshots that session.
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+from .enginePool import SessionLocks
+from .fileio import write_atomic
+
+class AutosaveService:
+    def __init__(self, directory: str = "autosaves", interval: float = 30.0, default_frequency: int = 5,
+                 locks: Optional[SessionLocks] = None):
+        self.directory = directory
+        self.locks = locks
+        self.interval = interval
+        self.default_frequency = default_frequency
+        # session id -> [engine, commands since the last write]
+        self._dirty: Dict[str, List[Any]] = {}
+        self._due: set = set()
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_callbacks: List[Callable[[], Any]] = []
+        self.marks = 0
+        self.coalesced = 0
+        self.writes = 0
+        self.failed_writes = 0
+        self.last_write_seconds: Optional[float] = None
+
+    def path_for(self, session_id: str) -> str:
+        """Returns the autosave file of a session; ids that are not plain names are hashed."""
+        if re.fullmatch(r"[A-Za-z0-9_-]{1,64}", session_id):
+            name = session_id
+        else:
+            name = hashlib.sha1(session_id.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.directory, f"autosave_{name}.json")
+
+    def frequency(self, engine) -> int:
+        frequency = engine.templates.get("game_settings", {}).get("autosave_frequency", self.default_frequency)
+        return max(int(frequency), 1)
+
+    def mark_dirty(self, session_id: str, engine, commands: int = 1):
+        """Records that a session changed. Cheap enough to call on every request."""
+        if not engine.current_run:
+            return
+        with self._lock:
+            self.marks += 1
+            entry = self._dirty.get(session_id)
+            if entry is None:
+                entry = self._dirty[session_id] = [engine, 0]
+            else:
+                self.coalesced += 1
+            entry[0] = engine
+            entry[1] += commands
+            due = entry[1] >= self.frequency(engine) and session_id not in self._due
+            if due:
+                self._due.add(session_id)
+        if due and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def on_flush(self, callback: Callable[[], Any]):
+        """Registers a function to run on a worker thread after each full flush and on shutdown."""
+        self._flush_callbacks.append(callback)
+
+    async def _run_flush_callbacks(self):
+        loop = asyncio.get_running_loop()
+        for callback in self._flush_callbacks:
+            try:
+                await loop.run_in_executor(None, callback)
+            except Exception as e:
+                print(f"Autosave flush callback {getattr(callback, '__name__', callback)} failed: {e}")
+
+    def _take(self, everything: bool) -> Dict[str, Any]:
+        with self._lock:
+            session_ids = list(self._dirty) if everything else list(self._due)
+            taken = {session_id: self._dirty.pop(session_id)[0] for session_id in session_ids if session_id in self._dirty}
+            self._due.difference_update(session_ids)
+        return taken
+
+    async def flush(self, everything: bool = True):
+        """Writes due sessions, or every dirty session when `everything` is set."""
+        taken = self._take(everything)
+        if not taken:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+        except OSError as e:
+            self.failed_writes += len(taken)
+            print(f"Autosave directory {self.directory} is unavailable, will retry: {e}")
+            self._requeue(list(taken.items()))
+            return
+        loop = asyncio.get_running_loop()
+        pending = list(taken.items())
+        while pending:
+            session_id, engine = pending.pop(0)
+            start = time.perf_counter()
+            try:
+                # Snapshot while no request is changing the engine, and
+                # leave the file I/O to a worker thread.
+                text = await self._snapshot(session_id, engine)
+                await loop.run_in_executor(None, write_atomic, self.path_for(session_id), text)
+            except asyncio.CancelledError:
+                self._requeue([(session_id, engine)] + pending)
+                raise
+            except Exception as e:
+                self.failed_writes += 1
+                print(f"Autosave of session '{session_id}' failed, will retry: {e}")
+                self._requeue([(session_id, engine)])
+                continue
+            self.writes += 1
+            self.last_write_seconds = time.perf_counter() - start
+
+    @staticmethod
+    def _save_text(engine) -> str:
+        data = engine.run_save_data()
+        # Where the run came from, so read() callers can rebuild it on the same templates.
+        data["templates_version"] = engine.template_version
+        if engine.content_id:
+            data["content_id"] = engine.content_id
+        return json.dumps(data, separators=(",", ":"))
+
+    async def _snapshot(self, session_id: str, engine) -> str:
+        if self.locks is None:
+            return self._save_text(engine)
+        async with self.locks.hold(session_id):
+            return self._save_text(engine)
+
+    def read(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Returns the last autosave of a session, or None if it has none or it cannot be read."""
+        path = self.path_for(session_id)
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Autosave {path} could not be read: {e}")
+            return None
+
+    def _requeue(self, pending: List[Any]):
+        """Puts sessions taken by an interrupted flush back, unless they were marked again since."""
+        with self._lock:
+            for session_id, engine in pending:
+                self._dirty.setdefault(session_id, [engine, 1])
+
+    async def _run(self):
+        # The full flush runs on its own schedule, so a steady stream of
+        # sessions becoming due cannot postpone it.
+        deadline = time.monotonic() + self.interval
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=max(deadline - time.monotonic(), 0))
+                self._wake.clear()
+            except asyncio.TimeoutError:
+                pass
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.interval
+                await self.flush(everything=True)
+                await self._run_flush_callbacks()
+            else:
+                await self.flush(everything=False)
+
+    def start(self):
+        """Starts the background task; call from the running event loop."""
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self._task = self._loop.create_task(self._run())
+
+    async def stop(self):
+        """Stops the background task and writes everything still dirty."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._loop = None
+        await self.flush(everything=True)
+        await self._run_flush_callbacks()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "dirty_sessions": len(self._dirty),
+            "marks": self.marks,
+            "writes": self.writes,
+            "coalesced_marks": self.coalesced,
+            "failed_writes": self.failed_writes,
+            "last_write_seconds": self.last_write_seconds
+        }
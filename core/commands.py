@@ -0,0 +1,100 @@
+# core/commands.py
+#
+# Command parsing shared by both engines. Verbs (one or more words, such as
+# "go" or "talk to") map to handler functions in a CommandRegistry, so new
+# verbs can be added without touching the engines. NameIndex holds the items
+# or NPCs of one location keyed by lowercased name for constant-time lookup.
+
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+Handler = Callable[[object, str], str]
+
+class CommandRegistry:
+    def __init__(self):
+        self._verbs: Dict[str, Handler] = {}
+        self._max_words = 1
+
+    def register(self, *verbs: str):
+        """Decorator registering a handler(engine, argument) -> str under one or more verbs."""
+        def decorator(handler: Handler) -> Handler:
+            for verb in verbs:
+                verb = " ".join(verb.lower().split())
+                self._verbs[verb] = handler
+                self._max_words = max(self._max_words, len(verb.split()))
+            return handler
+        return decorator
+
+    def unregister(self, verb: str):
+        self._verbs.pop(" ".join(verb.lower().split()), None)
+
+    def copy(self) -> "CommandRegistry":
+        registry = CommandRegistry()
+        registry._verbs = dict(self._verbs)
+        registry._max_words = self._max_words
+        return registry
+
+    def parse(self, command: str) -> Tuple[Optional[str], str]:
+        """Splits a command into (verb, argument); verb is None when no registered verb matches.
+
+        The longest registered verb wins, so "talk to guard" matches "talk to"
+        before "talk". Lookups are dict hits, independent of the verb count.
+        """
+        words = command.lower().split()
+        for n in range(min(self._max_words, len(words)), 0, -1):
+            verb = " ".join(words[:n])
+            if verb in self._verbs:
+                return verb, " ".join(words[n:])
+        return None, " ".join(words)
+
+    def dispatch(self, engine, command: str) -> Optional[str]:
+        """Runs the handler for the command, or returns None when no verb matches."""
+        verb, argument = self.parse(command)
+        if verb is None:
+            return None
+        return self._verbs[verb](engine, argument)
+
+    def handler(self, verb: str) -> Handler:
+        return self._verbs[verb]
+
+    def verbs(self) -> List[str]:
+        return list(self._verbs)
+
+class NameIndex:
+    """Entities of one location keyed by lowercased name, iterated in insertion order.
+
+    Names are lowercased once when an entity is added. Entities sharing a
+    name are kept in order, and find/pop return the first of them.
+    """
+
+    __slots__ = ("_by_name",)
+
+    def __init__(self, entities: Iterable = ()):
+        self._by_name: Dict[str, list] = {}
+        for entity in entities:
+            self.add(entity)
+
+    def add(self, entity):
+        self._by_name.setdefault(entity.name.lower(), []).append(entity)
+
+    def find(self, name: str):
+        stack = self._by_name.get(name)
+        return stack[0] if stack else None
+
+    def pop(self, name: str):
+        stack = self._by_name.get(name)
+        if not stack:
+            return None
+        entity = stack.pop(0)
+        if not stack:
+            del self._by_name[name]
+        return entity
+
+    def __iter__(self) -> Iterator:
+        for stack in self._by_name.values():
+            yield from stack
+
+    def __len__(self) -> int:
+        return sum(len(stack) for stack in self._by_name.values())
+
+    def __bool__(self) -> bool:
+        return bool(self._by_name)
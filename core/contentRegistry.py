@@ -0,0 +1,243 @@
+# core/contentRegistry.py
+#
+# Many adventures in one process. Each content id names a templates file
+# (the default id maps to templates.json, others to <directory>/<id>.json)
+# that is loaded on first use and then shared read-only by every session
+# playing it. Content sets that no session uses are evicted, least recently
+# used first, once the loaded sets exceed the memory budget.
+#
+# Story sets (story.json and the like, played by StoryEngine) are registered
+# by id and path, and are loaded, shared, reloaded and evicted the same way.
+#
+# Loading happens outside the registry lock, so a slow load only holds up
+# requests for the content set being loaded.
+
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+from .models import StoryData
+from .templateReload import TemplateReloader, TemplateVersion, forget_compiled, parse_templates
+
+CONTENT_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+def parse_story(raw: bytes) -> StoryData:
+    """Parses a story file for StoryEngine."""
+    return StoryData(**json.loads(raw))
+
+class ContentSet:
+    __slots__ = ("content_id", "kind", "reloader", "load_seconds", "sessions", "last_used")
+
+    def __init__(self, content_id: str, kind: str, reloader: TemplateReloader, load_seconds: float):
+        self.content_id = content_id
+        self.kind = kind
+        self.reloader = reloader
+        self.load_seconds = load_seconds
+        self.sessions = 0
+        self.last_used = time.time()
+
+class ContentRegistry:
+    """Loads content sets by id and keeps the loaded ones within a memory budget.
+
+    Memory is estimated from the parsed templates of every retained version.
+    The default set and sets with live sessions are never evicted, so the
+    budget can be exceeded while all loaded sets are in use.
+    """
+
+    def __init__(self, directory: str = "content", default_path: str = "templates.json",
+                 default_id: str = "default", memory_budget: int = 256 * 1024 * 1024, interval: float = 1.0,
+                 archive: Optional[str] = None, stories: Optional[Dict[str, str]] = None):
+        self.directory = directory
+        # Story set id -> story file
+        self.stories = dict(stories or {})
+        # Versions of a content set are archived under <archive>/<content id>/.
+        self.archive = archive
+        self.default_path = default_path
+        self.default_id = default_id
+        self.memory_budget = memory_budget
+        self.interval = interval
+        self._sets: "OrderedDict[str, ContentSet]" = OrderedDict()
+        self._lock = threading.RLock()
+        # content id -> event set once the load in progress finishes
+        self._loading: Dict[str, threading.Event] = {}
+        self._listeners: List[Callable[[str, TemplateVersion], None]] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.loads = 0
+        self.evictions = 0
+        self._set(default_id)
+
+    def resolve(self, content_id: Optional[str]) -> str:
+        return content_id or self.default_id
+
+    def kind(self, content_id: str) -> str:
+        return "story" if content_id in self.stories else "templates"
+
+    def path_for(self, content_id: str) -> str:
+        if content_id in self.stories:
+            return self.stories[content_id]
+        if content_id == self.default_id:
+            return self.default_path
+        if not CONTENT_ID.fullmatch(content_id):
+            raise KeyError(f"Invalid content id '{content_id}'")
+        return os.path.join(self.directory, f"{content_id}.json")
+
+    def available(self) -> List[str]:
+        """Templates sets that can be played: the default plus every file in the content directory."""
+        ids = [self.default_id]
+        if os.path.isdir(self.directory):
+            ids += sorted(name[:-5] for name in os.listdir(self.directory)
+                          if name.endswith(".json") and CONTENT_ID.fullmatch(name[:-5])
+                          and name[:-5] not in self.stories)
+        return ids
+
+    def _set(self, content_id: Optional[str], kind: Optional[str] = None) -> ContentSet:
+        content_id = self.resolve(content_id)
+        if kind is not None and self.kind(content_id) != kind:
+            raise KeyError(f"Content '{content_id}' is not a {kind} set")
+        while True:
+            with self._lock:
+                content = self._sets.get(content_id)
+                if content is not None:
+                    self._sets.move_to_end(content_id)
+                    content.last_used = time.time()
+                    return content
+                loading = self._loading.get(content_id)
+                if loading is None:
+                    loading = self._loading[content_id] = threading.Event()
+                    break
+            # Another thread is loading this set; use its result, or try
+            # again ourselves if that load failed.
+            loading.wait()
+        try:
+            content = self._load(content_id)
+            with self._lock:
+                self._sets[content_id] = content
+                self.loads += 1
+                self._evict(keep=content_id)
+        finally:
+            with self._lock:
+                del self._loading[content_id]
+            loading.set()
+        return content
+
+    def _load(self, content_id: str) -> ContentSet:
+        path = self.path_for(content_id)
+        if not os.path.exists(path):
+            raise KeyError(f"Unknown content '{content_id}'")
+        kind = self.kind(content_id)
+        start = time.perf_counter()
+        reloader = TemplateReloader(path, self.interval,
+                                    os.path.join(self.archive, content_id) if self.archive else None,
+                                    parse=parse_story if kind == "story" else parse_templates)
+        content = ContentSet(content_id, kind, reloader, time.perf_counter() - start)
+        reloader.on_swap(lambda version, content_id=content_id: self._swapped(content_id, version))
+        print(f"Content '{content_id}' loaded from {path} in {content.load_seconds * 1000:.1f} ms")
+        return content
+
+    def get(self, content_id: Optional[str] = None) -> TemplateReloader:
+        """Returns the templates of a content set, loading it on first use. Raises KeyError for unknown ids."""
+        return self._set(content_id, "templates").reloader
+
+    def story(self, content_id: Optional[str] = None) -> StoryData:
+        """Returns the current story of a story set, loading it on first use. Raises KeyError for unknown ids."""
+        return self._set(content_id, "story").reloader.current.templates
+
+    def acquire(self, content_id: Optional[str], version: str):
+        """Pins a content set and one of its versions for a session."""
+        while True:
+            content = self._set(content_id)
+            with self._lock:
+                # The set may have been evicted since _set returned it.
+                if self._sets.get(content.content_id) is content:
+                    content.sessions += 1
+                    content.reloader.acquire(version)
+                    return
+
+    def release(self, content_id: Optional[str], version: str):
+        with self._lock:
+            content = self._sets.get(self.resolve(content_id))
+            if content is None:
+                return
+            content.sessions -= 1
+            content.reloader.release(version)
+            if content.sessions <= 0:
+                self._evict()
+
+    def on_swap(self, listener: Callable[[str, TemplateVersion], None]):
+        """Calls listener(content_id, version) whenever a content set is reloaded."""
+        self._listeners.append(listener)
+
+    def _swapped(self, content_id: str, version: TemplateVersion):
+        for listener in self._listeners:
+            listener(content_id, version)
+        with self._lock:
+            self._evict()
+
+    def memory_bytes(self) -> int:
+        with self._lock:
+            sets = list(self._sets.values())
+        return sum(content.reloader.memory_bytes() for content in sets)
+
+    def _evict(self, keep: Optional[str] = None):
+        """Drops idle content sets, least recently used first, until the loaded sets fit the budget."""
+        total = self.memory_bytes()
+        for content in list(self._sets.values()):
+            if total <= self.memory_budget:
+                break
+            if content.sessions > 0 or content.content_id in (self.default_id, keep):
+                continue
+            total -= content.reloader.memory_bytes()
+            del self._sets[content.content_id]
+            for version in content.reloader.retained():
+                forget_compiled(version.templates)
+            self.evictions += 1
+            print(f"Content '{content.content_id}' evicted to stay within the memory budget")
+
+    def check(self):
+        """Reloads every loaded content set whose file changed."""
+        with self._lock:
+            sets = list(self._sets.values())
+        for content in sets:
+            content.reloader.check()
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name="content-reloader", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sets = list(self._sets.values())
+        per_content = {}
+        for content in sets:
+            entry = content.reloader.stats()
+            entry.update({
+                "kind": content.kind,
+                "sessions": content.sessions,
+                "load_seconds": content.load_seconds,
+                "last_used": content.last_used
+            })
+            per_content[content.content_id] = entry
+        return {
+            "loaded": len(per_content),
+            "memory_bytes": sum(entry["memory_bytes"] for entry in per_content.values()),
+            "memory_budget": self.memory_budget,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "content": per_content
+        }
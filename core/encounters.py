@@ -0,0 +1,122 @@
+# core/encounters.py
+#
+# Random encounters from the templates' "encounters" section. Eligibility and
+# probabilities only depend on the templates, so they are compiled once into
+# a per-location alias table; a move then costs one table lookup and one RNG
+# draw no matter how many encounter templates exist.
+
+import random
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+# Compiled tables by templates dict, enough for every content set and old
+# template version still in use to stay compiled.
+MAX_COMPILED = 64
+_tables: Dict[int, Tuple[dict, "EncounterTable"]] = {}
+# Sessions run on worker threads, so compiling and evicting take this lock.
+_compile_lock = threading.Lock()
+
+def location_types(loc_id: str, loc_data: dict, known_types: List[str]) -> List[str]:
+    """Types of a location: its explicit "types" field, or the known types named in its id or name."""
+    if "types" in loc_data:
+        return list(loc_data["types"])
+    text = f"{loc_id} {loc_data.get('name', '')}".lower()
+    return [t for t in known_types if t in text]
+
+class AliasTable:
+    """Walker alias table over encounter ids, with None for "nothing happens"."""
+
+    __slots__ = ("outcomes", "probability", "alias")
+
+    def __init__(self, weighted: List[Tuple[Optional[str], float]]):
+        n = len(weighted)
+        self.outcomes = [outcome for outcome, _ in weighted]
+        scaled = [weight * n for _, weight in weighted]
+        self.probability = [1.0] * n
+        self.alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.probability[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+
+    def draw(self, rng: random.Random) -> Optional[str]:
+        u = rng.random() * len(self.outcomes)
+        i = int(u)
+        return self.outcomes[i] if u - i < self.probability[i] else self.outcomes[self.alias[i]]
+
+class EncounterTable:
+    """Per-location encounter tables compiled from a templates dict."""
+
+    def __init__(self, templates: dict):
+        self.encounters: Dict[str, dict] = templates.get("encounters", {})
+        self.enabled = templates.get("game_settings", {}).get("random_events", True)
+        known_types = sorted({t for enc in self.encounters.values() for t in enc.get("conditions", {}).get("location_types", [])})
+        by_type: Dict[str, List[str]] = {}
+        for enc_id, enc in self.encounters.items():
+            for t in enc.get("conditions", {}).get("location_types", []):
+                by_type.setdefault(t, []).append(enc_id)
+
+        self.tables: Dict[str, AliasTable] = {}
+        for loc_id, loc_data in templates.get("locations", {}).items():
+            eligible = {}
+            for t in location_types(loc_id, loc_data, known_types):
+                for enc_id in by_type.get(t, []):
+                    eligible[enc_id] = True
+            if not eligible:
+                continue
+            weighted = [(enc_id, self.encounters[enc_id]["conditions"].get("probability", 0.0)) for enc_id in eligible]
+            total = sum(weight for _, weight in weighted)
+            if total > 1.0:
+                weighted = [(enc_id, weight / total) for enc_id, weight in weighted]
+            else:
+                weighted.append((None, 1.0 - total))
+            self.tables[loc_id] = AliasTable(weighted)
+
+    def draw(self, template_id: str, rng: random.Random) -> Optional[str]:
+        table = self.tables.get(template_id)
+        if table is None or not self.enabled:
+            return None
+        return table.draw(rng)
+
+def encounter_table(templates: dict) -> EncounterTable:
+    """Returns the compiled table for a templates dict, compiling it on first use."""
+    entry = _tables.get(id(templates))
+    if entry is None or entry[0] is not templates:
+        with _compile_lock:
+            entry = _tables.get(id(templates))
+            if entry is None or entry[0] is not templates:
+                entry = (templates, EncounterTable(templates))
+                _tables[id(templates)] = entry
+                if len(_tables) > MAX_COMPILED:
+                    del _tables[next(iter(_tables))]
+    return entry[1]
+
+def forget_compiled(templates: dict):
+    """Drops the compiled copy of a templates dict that is no longer served."""
+    with _compile_lock:
+        entry = _tables.get(id(templates))
+        if entry is not None and entry[0] is templates:
+            del _tables[id(templates)]
+
+def meets_requirements(encounter: dict, inventory: Dict[str, Any]) -> bool:
+    """An item satisfies a requirement when it has that type or a truthy property of that name."""
+    for requirement in encounter.get("conditions", {}).get("requires", []):
+        if not any(item.properties.get(requirement) or item.properties.get("type") == requirement
+                   for item in inventory.values()):
+            return False
+    return True
+
+def resolve(encounter: dict, rng: random.Random) -> Tuple[bool, str]:
+    """Rolls the outcome of an encounter. Harder encounters fail more often; discoveries always succeed."""
+    if encounter.get("type") == "discovery":
+        return True, ""
+    success = rng.random() >= encounter.get("difficulty", 1) * 0.15
+    outcomes = encounter.get("outcomes", {})
+    text = outcomes.get("success" if success else "failure", "")
+    if not text:
+        text = "You prevail." if success else "You barely escape."
+    return success, text
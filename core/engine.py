@@ -1,13 +1,31 @@
 import json
 import os
+from collections import deque
 from typing import Dict, Any, Optional, List
 from transformers import pipeline
 from .models import Item, Choice, Scene, StoryMetadata, StoryData, GameState
 from nltk.tokenize import sent_tokenize
+from .commands import CommandRegistry, NameIndex
+from .admission import WorkPool, generation_pool as shared_generation_pool
 class StoryEngine:
-    def __init__(self, story_file: str):
-        self.story_data = self.load_story(story_file)
+    # Verbs handled before falling back to the current scene's choices.
+    commands = CommandRegistry()
+    # Commands kept for undo.
+    max_undo = 100
+
+    def __init__(self, story_file: Optional[str] = None, generation_pool: Optional[WorkPool] = None,
+                 story: Optional[StoryData] = None):
+        """`generation_pool` bounds concurrent text generation, by default across all engines in the process;
+        renders over the limit skip the generated addon. `story` is an already parsed story, such as one
+        shared through a ContentRegistry, and is used instead of reading `story_file`."""
+        self.generation_pool = generation_pool or shared_generation_pool
+        self.story_data = story if story is not None else self.load_story(story_file)
+        self.scenes: Dict[str, Scene] = {scene.id: scene for scene in self.story_data.scenes}
+        # Items left in each scene, indexed by lowercased name.
+        self.scene_items: Dict[str, NameIndex] = {scene.id: NameIndex(scene.items) for scene in self.story_data.scenes}
         self.game_state = GameState(location="start", inventory={}, flags=[])
+        # (game state, location, items left there) before each command that changed something
+        self.undo_stack: deque = deque(maxlen=self.max_undo)
         self.narrative_pipeline = pipeline('text-generation', model='microsoft/DialoGPT-medium') # or your model
 
     def load_story(self, story_file: str) -> StoryData:
@@ -26,7 +44,7 @@ class StoryEngine:
 
     def get_current_scene(self) -> Scene:
         """Returns the current scene based on the game state."""
-        scene = next((s for s in self.story_data.scenes if s.id == self.game_state.location), None)
+        scene = self.scenes.get(self.game_state.location)
         if scene is None:
             raise ValueError(f"Scene with id '{self.game_state.location}' not found.")
         return scene
@@ -34,88 +52,108 @@ class StoryEngine:
     def process_command(self, command: str) -> str:
         """Processes the given command and updates the game state."""
         print(f"Processing command: {command}")  # Log the command being processed
-        command = command.lower()
+        command = " ".join(command.lower().split())
         scene = self.get_current_scene()
         print(f"Current scene: {scene.id}")  # Log the current scene ID
 
-        if command.startswith("go "):
-            direction = command[3:].strip()
-            for choice in scene.choices:
-                if choice.action == f"go {direction}":
+        if command == "undo":
+            return self.undo()
+        # A command only ever changes the items of the scene it runs in, so
+        # that scene's items and the game state are all an undo needs.
+        before = (self.game_state.copy(deep=True), scene.id, list(self.scene_items[scene.id]))
+        result = self._run_command(command, scene)
+        if self.game_state != before[0] or len(self.scene_items[scene.id]) != len(before[2]):
+            self.undo_stack.append(before)
+        return result
+
+    def undo(self) -> str:
+        """Reverts the last command that changed the game."""
+        if not self.undo_stack:
+            return "There is nothing to undo."
+        self.game_state, scene_id, items = self.undo_stack.pop()
+        self.scene_items[scene_id] = NameIndex(items)
+        return "You take back your last action."
+
+    def _run_command(self, command: str, scene: Scene) -> str:
+        result = self.commands.dispatch(self, command)
+        if result is not None:
+            return result
+
+        # Check for other actions defined in choices
+        for choice in scene.choices:
+            if choice.action == command:
+                if self.evaluate_condition(choice.condition):
                     self.game_state.location = choice.next_scene
-                    return f"You went {direction}."
-            return "You can't go that way."
-        elif command.startswith("take "):
-            item_name = command[5:].strip()
-            print(f"Attempting to take item: {item_name}")  # Log the item name
 
-            # Find the item in the scene
-            item = next((i for i in scene.items if i.name == item_name), None)
+                    # Apply choice effects
+                    if choice.add_inventory:
+                        self.game_state.inventory.append(choice.add_inventory)
+                    if choice.set_flag:
+                        if choice.set_flag not in self.game_state.flags:
+                            self.game_state.flags.append(choice.set_flag)
+                            print(f"Flag '{choice.set_flag}' added to game state.")
 
-            if item:
-                print(f"Item found: {item.name}")
-                self.game_state.inventory[item.name] = item # Add the item to the inventory
-                scene.items = [i for i in scene.items if i.name != item.name]  # Remove from scene
-                print(f"Item '{item_name}' added to inventory and removed from scene.")  # Log the action
-                return f"You took the {item_name}."
-            else:
-                print(f"Item not found in scene.")  # Log that the item was not found
-                return f"You can't take the {item_name}."
-        elif command.startswith("drop "):
-            item_name = command[5:].strip()
-            if item_name in self.game_state.inventory:
-                del self.game_state.inventory[item_name]
-                # Add the item back to the scene (simplified, no item properties)
-                scene.items.append(Item(name=item_name, description="A dropped item", properties={}))
-                return f"You dropped the {item_name}."
-            return f"You don't have the {item_name}."
-        elif command == "inventory":
-            if not self.game_state.inventory:
-                return "You aren't carrying anything."
-            else:
-                return f"You are carrying: {', '.join(self.game_state.inventory.keys())}"
-        elif command.startswith("use "):
-            item_name = command[4:].strip()
-            if item_name in self.game_state.inventory:
-                item_properties = self.game_state.inventory[item_name]
-                if "damage" in item_properties:
-                    damage = item_properties["damage"]
-                    return f"You use the {item_name} and inflict {damage} damage!"
-                elif "heal" in item_properties:
-                    heal = item_properties["heal"]
-                    return f"You use the {item_name} and heal {heal} health!"
+                    return f"You {choice.action}."
                 else:
-                    return f"You use the {item_name}, but it doesn't seem to have any effect."
-            else:
-                return f"You don't have a {item_name} in your inventory."
-        elif command.startswith("save "):
-            save_file = command[5:].strip()
-            self.save_game(save_file)
-            return f"Game saved to {save_file}"
-        elif command.startswith("load "):
-            save_file = command[5:].strip()
-            self.load_game(save_file)
-            return f"Game loaded from {save_file}"
-        else:
-            # Check for other actions defined in choices
-            for choice in scene.choices:
-                if choice.action == command:
-                    if self.evaluate_condition(choice.condition):
-                        self.game_state.location = choice.next_scene
+                    return "You can't do that yet."
+        return "Invalid command."
 
-                        # Apply choice effects
-                        if choice.add_inventory:
-                            self.game_state.inventory.append(choice.add_inventory)
-                        if choice.set_flag:
-                            if choice.set_flag not in self.game_state.flags:
-                                self.game_state.flags.append(choice.set_flag)
-                                print(f"Flag '{choice.set_flag}' added to game state.")
+    @commands.register("go")
+    def _cmd_go(self, direction: str) -> str:
+        for choice in self.get_current_scene().choices:
+            if choice.action == f"go {direction}":
+                self.game_state.location = choice.next_scene
+                return f"You went {direction}."
+        return "You can't go that way."
 
-                        return f"You {choice.action}."
-                    else:
-                        return "You can't do that yet."
-            return "Invalid command."
-    
+    @commands.register("take")
+    def _cmd_take(self, item_name: str) -> str:
+        print(f"Attempting to take item: {item_name}")  # Log the item name
+        item = self.scene_items[self.game_state.location].pop(item_name)
+        if item:
+            self.game_state.inventory[item.name] = item # Add the item to the inventory
+            print(f"Item '{item_name}' added to inventory and removed from scene.")  # Log the action
+            return f"You took the {item_name}."
+        print(f"Item not found in scene.")  # Log that the item was not found
+        return f"You can't take the {item_name}."
+
+    @commands.register("drop")
+    def _cmd_drop(self, item_name: str) -> str:
+        if item_name in self.game_state.inventory:
+            del self.game_state.inventory[item_name]
+            # Add the item back to the scene (simplified, no item properties)
+            self.scene_items[self.game_state.location].add(Item(name=item_name, description="A dropped item", properties={}))
+            return f"You dropped the {item_name}."
+        return f"You don't have the {item_name}."
+
+    @commands.register("inventory")
+    def _cmd_inventory(self, argument: str) -> str:
+        if not self.game_state.inventory:
+            return "You aren't carrying anything."
+        return f"You are carrying: {', '.join(self.game_state.inventory.keys())}"
+
+    @commands.register("use")
+    def _cmd_use(self, item_name: str) -> str:
+        if item_name not in self.game_state.inventory:
+            return f"You don't have a {item_name} in your inventory."
+        item_properties = self.game_state.inventory[item_name].properties
+        if "damage" in item_properties:
+            damage = item_properties["damage"]
+            return f"You use the {item_name} and inflict {damage} damage!"
+        elif "heal" in item_properties:
+            heal = item_properties["heal"]
+            return f"You use the {item_name} and heal {heal} health!"
+        return f"You use the {item_name}, but it doesn't seem to have any effect."
+
+    @commands.register("save")
+    def _cmd_save(self, save_file: str) -> str:
+        self.save_game(save_file)
+        return f"Game saved to {save_file}"
+
+    @commands.register("load")
+    def _cmd_load(self, save_file: str) -> str:
+        self.load_game(save_file)
+        return f"Game loaded from {save_file}"
 
     def clean_generated_text(self, text: str) -> str:
         sentences = sent_tokenize(text)
@@ -205,8 +243,11 @@ class StoryEngine:
             scene.descriptions[0]['text']
         )
 
-        # Generate dynamic add-on description
-        dynamic_addon = self.generate_dynamic_text("", max_length=25)
+        # Generate dynamic add-on description, unless generation is already busy
+        dynamic_addon = ""
+        with self.generation_pool.slot() as admitted:
+            if admitted:
+                dynamic_addon = self.generate_dynamic_text("", max_length=25)
     
         # Only add dynamic content if it's meaningful
         full_description = description
@@ -216,7 +257,7 @@ class StoryEngine:
         return {
             "scene_id": scene.id,
             "description": full_description,
-            "items": [item.name for item in scene.items],
+            "items": [item.name for item in self.scene_items[scene.id]],
             "choices": [choice.action for choice in scene.choices if self.evaluate_condition(choice.condition)],
             "inventory": list(self.game_state.inventory.keys()),
             "location": self.game_state.location,
@@ -0,0 +1,122 @@
+# core/enginePool.py
+#
+# Runs engine work off the event loop. Handlers hand their synchronous part
+# (loading the session, scene generation, commands, save file I/O) to a
+# bounded pool of worker threads, so one slow request no longer stalls every
+# other connection. Requests for one session wait on that session's lock and
+# run in arrival order, while different sessions run side by side.
+#
+# Threads rather than processes: engines are live objects in the session
+# cache, and pickling them across a process boundary on every request would
+# cost more than most commands do.
+
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+class SessionLocks:
+    """One asyncio lock per session, dropped once no request holds or waits for it.
+
+    Only used from the event loop. asyncio locks wake waiters in the order
+    they arrived, so a session's requests run in the order they came in.
+    """
+
+    def __init__(self):
+        # session id -> [lock, requests holding or waiting for it]
+        self._locks: Dict[str, List[Any]] = {}
+        self.waits = 0
+
+    @asynccontextmanager
+    async def hold(self, session_id: str) -> AsyncIterator[None]:
+        entry = self._locks.get(session_id)
+        if entry is None:
+            entry = self._locks[session_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            if entry[0].locked():
+                self.waits += 1
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[session_id]
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+class EnginePool:
+    """Bounded pool of worker threads for engine calls.
+
+    With `workers` set to 0 calls run inline on the event loop, which is how
+    the API behaved before and is useful for comparing the two.
+    """
+
+    def __init__(self, workers: int = 8, locks: Optional[SessionLocks] = None):
+        self.workers = workers
+        self.locks = locks or SessionLocks()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="engine") if workers > 0 else None
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.pending = 0
+        self.running = 0
+        self.queue_seconds = 0.0
+        self.max_queue_seconds = 0.0
+
+    def _timed(self, submitted: float, fn: Callable[[], Any]) -> Any:
+        waited = time.perf_counter() - submitted
+        with self._lock:
+            self.pending -= 1
+            self.running += 1
+            self.queue_seconds += waited
+            self.max_queue_seconds = max(self.max_queue_seconds, waited)
+        try:
+            return fn()
+        finally:
+            with self._lock:
+                self.running -= 1
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Runs fn(*args, **kwargs) on a worker thread and returns its result."""
+        call = functools.partial(fn, *args, **kwargs)
+        with self._lock:
+            self.calls += 1
+            self.pending += 1
+        if self._executor is None:
+            return self._timed(time.perf_counter(), call)
+        future = asyncio.get_running_loop().run_in_executor(
+            self._executor, self._timed, time.perf_counter(), call)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # A running thread cannot be stopped. Wait for it, so that a
+            # caller holding a session lock does not release it while the
+            # engine is still being changed.
+            await asyncio.wait({future})
+            raise
+
+    async def run_for(self, session_id: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Runs fn for a session once every earlier request of that session has finished."""
+        async with self.locks.hold(session_id):
+            return await self.run(fn, *args, **kwargs)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "calls": self.calls,
+                "pending": self.pending,
+                "running": self.running,
+                "mean_queue_seconds": self.queue_seconds / self.calls if self.calls else 0.0,
+                "max_queue_seconds": self.max_queue_seconds,
+                "locked_sessions": len(self.locks),
+                "session_waits": self.locks.waits
+            }
@@ -0,0 +1,27 @@
+# core/fileio.py
+#
+# File helpers shared by the engine, the services and the story editor.
+
+import os
+import tempfile
+from typing import Union
+
+def write_atomic(filename: str, data: Union[str, bytes]):
+    """Writes data to a temporary file next to `filename`, then renames it into place.
+
+    Readers see either the old file or the new one, never a partial write.
+    Text is written as UTF-8.
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(filename)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filename)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
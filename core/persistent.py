@@ -0,0 +1,318 @@
+# core/persistent.py
+#
+# Persistent (immutable) map and set for run state that is snapshotted. An
+# update returns a new map that shares every node it did not touch with the
+# old one, so keeping a snapshot is just keeping a reference, and memory
+# grows with the number of changes rather than the number of snapshots.
+#
+# The map is a hash array mapped trie: 32-way nodes indexed by five bits of
+# the key's hash at a time, so an update copies one small node per level.
+
+from typing import Any, Iterable, Iterator, Optional, Tuple
+
+_BITS = 5
+_WIDTH = 1 << _BITS
+_MASK = _WIDTH - 1
+_HASH_MASK = (1 << 64) - 1
+_EMPTY_NODE = (None,) * _WIDTH
+_MISSING = object()
+
+class _Leaf:
+    """All entries whose keys share one full hash."""
+
+    __slots__ = ("hash", "pairs")
+
+    def __init__(self, key_hash: int, pairs: Tuple[Tuple[Any, Any], ...]):
+        self.hash = key_hash
+        self.pairs = pairs
+
+def _place(node: tuple, leaf: _Leaf, shift: int) -> tuple:
+    index = (leaf.hash >> shift) & _MASK
+    return node[:index] + (leaf,) + node[index + 1:]
+
+def _set(node: tuple, key_hash: int, shift: int, key, value) -> Tuple[tuple, bool]:
+    """Returns (new node, whether a key was added); returns the node itself when nothing changes."""
+    index = (key_hash >> shift) & _MASK
+    child = node[index]
+    added = False
+    if child is None:
+        child = _Leaf(key_hash, ((key, value),))
+        added = True
+    elif isinstance(child, _Leaf):
+        if child.hash == key_hash:
+            pairs = child.pairs
+            for i, (k, v) in enumerate(pairs):
+                if k == key:
+                    if v is value:
+                        return node, False
+                    child = _Leaf(key_hash, pairs[:i] + ((key, value),) + pairs[i + 1:])
+                    break
+            else:
+                child = _Leaf(key_hash, pairs + ((key, value),))
+                added = True
+        else:
+            # Two different hashes meet in one slot: push the old leaf one level down.
+            child, added = _set(_place(_EMPTY_NODE, child, shift + _BITS), key_hash, shift + _BITS, key, value)
+    else:
+        new_child, added = _set(child, key_hash, shift + _BITS, key, value)
+        if new_child is child:
+            return node, False
+        child = new_child
+    return node[:index] + (child,) + node[index + 1:], added
+
+def _delete(node: tuple, key_hash: int, shift: int, key) -> Optional[tuple]:
+    """Returns the node without the key, or None when the key is not there."""
+    index = (key_hash >> shift) & _MASK
+    child = node[index]
+    if child is None:
+        return None
+    if isinstance(child, _Leaf):
+        if child.hash != key_hash:
+            return None
+        pairs = tuple(pair for pair in child.pairs if pair[0] != key)
+        if len(pairs) == len(child.pairs):
+            return None
+        child = _Leaf(key_hash, pairs) if pairs else None
+    else:
+        child = _delete(child, key_hash, shift + _BITS, key)
+        if child is None:
+            return None
+        if child == _EMPTY_NODE:
+            child = None
+    return node[:index] + (child,) + node[index + 1:]
+
+def _iter(node: tuple) -> Iterator[Tuple[Any, Any]]:
+    stack = [node]
+    while stack:
+        for child in stack.pop():
+            if child is None:
+                continue
+            if isinstance(child, _Leaf):
+                yield from child.pairs
+            else:
+                stack.append(child)
+
+def _pairs(child) -> Iterator[Tuple[Any, Any]]:
+    if child is None:
+        return iter(())
+    if isinstance(child, _Leaf):
+        return iter(child.pairs)
+    return _iter(child)
+
+def _diff(a: tuple, b: tuple, out: list):
+    for child_a, child_b in zip(a, b):
+        if child_a is child_b:
+            continue
+        if isinstance(child_a, tuple) and isinstance(child_b, tuple):
+            _diff(child_a, child_b, out)
+            continue
+        pairs_a = dict(_pairs(child_a))
+        pairs_b = dict(_pairs(child_b))
+        for key in pairs_a.keys() | pairs_b.keys():
+            if pairs_a.get(key, _MISSING) != pairs_b.get(key, _MISSING):
+                out.append(key)
+
+class PMap:
+    """Immutable hash map; set() and delete() return a new map."""
+
+    __slots__ = ("_root", "_len")
+
+    def __init__(self, items: Iterable[Tuple[Any, Any]] = ()):
+        self._root = _EMPTY_NODE
+        self._len = 0
+        for key, value in items:
+            self._root, added = _set(self._root, hash(key) & _HASH_MASK, 0, key, value)
+            self._len += added
+
+    @classmethod
+    def _make(cls, root: tuple, length: int) -> "PMap":
+        result = cls.__new__(cls)
+        result._root = root
+        result._len = length
+        return result
+
+    def get(self, key, default=None):
+        key_hash = hash(key) & _HASH_MASK
+        node = self._root
+        shift = 0
+        while True:
+            child = node[(key_hash >> shift) & _MASK]
+            if child is None:
+                return default
+            if isinstance(child, _Leaf):
+                if child.hash == key_hash:
+                    for k, v in child.pairs:
+                        if k == key:
+                            return v
+                return default
+            node = child
+            shift += _BITS
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator:
+        for key, _ in _iter(self._root):
+            yield key
+
+    def items(self) -> Iterator[Tuple[Any, Any]]:
+        return _iter(self._root)
+
+    def set(self, key, value) -> "PMap":
+        root, added = _set(self._root, hash(key) & _HASH_MASK, 0, key, value)
+        if root is self._root:
+            return self
+        return PMap._make(root, self._len + added)
+
+    def delete(self, key) -> "PMap":
+        root = _delete(self._root, hash(key) & _HASH_MASK, 0, key)
+        if root is None:
+            return self
+        return PMap._make(root, self._len - 1)
+
+    def changed_keys(self, other: "PMap") -> list:
+        """Keys whose values differ between two maps.
+
+        Subtrees the maps share are skipped, so comparing a map with one
+        derived from it costs time in proportion to the updates between them.
+        """
+        out = []
+        if self._root is not other._root:
+            _diff(self._root, other._root, out)
+        return out
+
+    def __eq__(self, other) -> bool:
+        if self is other:
+            return True
+        if not isinstance(other, PMap) or len(self) != len(other):
+            return False
+        return all(other.get(key, _MISSING) == value for key, value in self.items())
+
+    def __repr__(self) -> str:
+        return f"PMap({dict(self.items())!r})"
+
+class PSet:
+    """Immutable set; add() and discard() return a new set."""
+
+    __slots__ = ("_map",)
+
+    def __init__(self, items: Iterable = ()):
+        self._map = PMap((item, True) for item in items)
+
+    @classmethod
+    def _make(cls, pmap: PMap) -> "PSet":
+        result = cls.__new__(cls)
+        result._map = pmap
+        return result
+
+    def add(self, item) -> "PSet":
+        pmap = self._map.set(item, True)
+        return self if pmap is self._map else PSet._make(pmap)
+
+    def discard(self, item) -> "PSet":
+        pmap = self._map.delete(item)
+        return self if pmap is self._map else PSet._make(pmap)
+
+    def changed_items(self, other: "PSet") -> list:
+        """Items in exactly one of the two sets; as cheap as PMap.changed_keys()."""
+        return self._map.changed_keys(other._map)
+
+    def __contains__(self, item) -> bool:
+        return item in self._map
+
+    def __len__(self) -> int:
+        return len(self._map)
+
+    def __iter__(self) -> Iterator:
+        return iter(self._map)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, PSet) and self._map == other._map
+
+    def __repr__(self) -> str:
+        return f"PSet({list(self)!r})"
+
+class POrderedMap:
+    """Immutable map that iterates in insertion order, like a dict.
+
+    Entries carry an insertion number, so iteration sorts them; that is
+    meant for the small maps shown to players (inventory, flags), while
+    lookups and updates cost the same as PMap.
+    """
+
+    __slots__ = ("_map", "_next")
+
+    def __init__(self, items: Iterable[Tuple[Any, Any]] = ()):
+        self._map = PMap()
+        self._next = 0
+        for key, value in items:
+            self._map = self._map.set(key, (self._map.get(key, (self._next,))[0], value))
+            self._next += 1
+
+    @classmethod
+    def _make(cls, pmap: PMap, next_number: int) -> "POrderedMap":
+        result = cls.__new__(cls)
+        result._map = pmap
+        result._next = next_number
+        return result
+
+    def get(self, key, default=None):
+        entry = self._map.get(key)
+        return default if entry is None else entry[1]
+
+    def __getitem__(self, key):
+        return self._map[key][1]
+
+    def __contains__(self, key) -> bool:
+        return key in self._map
+
+    def __len__(self) -> int:
+        return len(self._map)
+
+    def __bool__(self) -> bool:
+        return len(self._map) > 0
+
+    def items(self) -> Iterator[Tuple[Any, Any]]:
+        for key, (_, value) in sorted(self._map.items(), key=lambda pair: pair[1][0]):
+            yield key, value
+
+    def keys(self) -> Iterator:
+        for key, _ in self.items():
+            yield key
+
+    def values(self) -> Iterator:
+        for _, value in self.items():
+            yield value
+
+    def __iter__(self) -> Iterator:
+        return self.keys()
+
+    def set(self, key, value) -> "POrderedMap":
+        """Returns a map with key set; a key already present keeps its position."""
+        entry = self._map.get(key)
+        if entry is not None:
+            if entry[1] is value:
+                return self
+            return POrderedMap._make(self._map.set(key, (entry[0], value)), self._next)
+        return POrderedMap._make(self._map.set(key, (self._next, value)), self._next + 1)
+
+    def delete(self, key) -> "POrderedMap":
+        pmap = self._map.delete(key)
+        return self if pmap is self._map else POrderedMap._make(pmap, self._next)
+
+    def __eq__(self, other) -> bool:
+        if self is other:
+            return True
+        return isinstance(other, POrderedMap) and list(self.items()) == list(other.items())
+
+    def __repr__(self) -> str:
+        return f"POrderedMap({dict(self.items())!r})"
@@ -2,44 +2,249 @@
 
 import json
 import random
-import hashlib
-from typing import Dict, Any, Optional, List, Set
-from .models import Item, Choice, Scene, GameState
+import secrets
+from collections import OrderedDict, deque
+from typing import Dict, Any, Optional, List, Set, Tuple
+from .models import Item
+from .runtime import RuntimeItem, RuntimeNpc, RuntimeSnapshot, RuntimeState
+from .encounters import encounter_table, meets_requirements, resolve
+from .quests import ITEM_TAKEN, LOCATION_ENTERED, NPC_TALKED, QuestLog, quest_book
+from .commands import CommandRegistry, NameIndex
+from .fileio import write_atomic
+from .persistent import PMap, POrderedMap, PSet
+from .worldSynth import WorldSynthesizer, location_coords, location_template_id, spawn_item, spawn_npc
+
+# Parts of the scene data that are cached between get_current_scene_data()
+# calls. Everything is rebuilt when the run or the location changes; within
+# a location, commands mark the parts they change with _touch().
+SCENE_PARTS = ("exits", "contents", "inventory")
+
+# Commands that manage the run history rather than play it; they are not
+# themselves undone.
+HISTORY_VERBS = ("undo", "checkpoint", "restore")
+
+# Scene fields compared by scene_diff().
+DIFF_FIELDS = ("scene_id", "description", "choices", "items", "npcs", "inventory", "current_conversation", "visited_scenes")
+
+def scene_diff(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns the fields of `after` that differ from `before`.
+
+    Unchanged parts of consecutive scenes are the same list objects, so most
+    fields are settled by an identity check.
+    """
+    changes = {}
+    for field in DIFF_FIELDS:
+        value = after.get(field)
+        old = before.get(field)
+        if value is not old and value != old:
+            changes[field] = value
+    return changes
+
+def history_delta(history: Tuple[str, ...], base: Tuple[str, ...]) -> list:
+    """Encodes a location history against another as [k, *prefix]: the prefix followed by base[:k].
+
+    Consecutive histories mostly overlap, so this is usually one location.
+    """
+    for k in range(min(len(history), len(base)), 0, -1):
+        if history[len(history) - k:] == base[:k]:
+            return [k] + list(history[:len(history) - k])
+    return [0] + list(history)
+
+def apply_history_delta(delta: list, base: Tuple[str, ...]) -> Tuple[str, ...]:
+    return tuple(delta[1:]) + base[:delta[0]]
 
 class ProceduralRun:
     def __init__(self, seed: str):
         self.seed = seed
-        self.generated_scenes: Dict[str, Scene] = {}
+        self.rng = random.Random(seed)
+        # Location data by id: the template table itself for hand-written
+        # worlds, or the templates chosen for each loaded cell when synthesized.
+        self.locations: Dict[str, dict] = {}
+        self.world: Optional[WorldSynthesizer] = None
+        self.loaded_regions: "OrderedDict[Tuple[int, int], List[str]]" = OrderedDict()
         self.scene_connections: Dict[str, Dict[str, str]] = {}
-        self.spawned_items: Dict[str, List[Item]] = {}
-        self.spawned_npcs: Dict[str, List[dict]] = {}
-        self.visited_scenes: Set[str] = set()
-        self.location_history: List[str] = []
+        self.spawned_items: Dict[str, NameIndex] = {}
+        self.spawned_npcs: Dict[str, NameIndex] = {}
+        # Items each location was generated with, for rebuilding spawned_items
+        # when a snapshot is restored.
+        self.spawned_base: Dict[str, Tuple[RuntimeItem, ...]] = {}
+        self.visited_scenes = PSet()
+        # The last ten locations, oldest first; replaced on change so snapshots can share it.
+        self.location_history: Tuple[str, ...] = ()
+        # Number of moves made; encounter rolls are keyed by it so they are
+        # reproducible from the seed even after the run is rebuilt.
+        self.moves = 0
+        self.quests: Optional[QuestLog] = None
+        # Names of the items the player removed from each location, as a
+        # persistent map of tuples; together with the seed this is everything
+        # needed to rebuild the world.
+        self.removed_items = PMap()
+        # Snapshots taken before each command, for undo, and named checkpoints.
+        self.undo: "deque[RuntimeSnapshot]" = deque(maxlen=ProceduralStoryEngine.max_undo)
+        self.checkpoints: Dict[str, RuntimeSnapshot] = {}
 
 class ProceduralStoryEngine:
-    def __init__(self, templates_file: str):
-        self.templates = self.load_templates(templates_file)
+    # Verbs understood by process_command; register more with
+    # ProceduralStoryEngine.commands.register("verb").
+    commands = CommandRegistry()
+
+    # Commands that can be taken back with "undo".
+    max_undo = 100
+    # Named checkpoints kept per run; the oldest is dropped beyond this.
+    max_checkpoints = 1000
+
+    # Regions kept in memory for synthesized worlds; the 3x3 block around the
+    # player is always loaded and the rest are dropped least recently used.
+    max_loaded_regions = 16
+
+    def __init__(self, templates_file: str = None, templates: dict = None):
+        self.templates = templates if templates is not None else self.load_templates(templates_file)
+        # Name of the templates version this engine runs on, when hot reloading is used.
+        self.template_version: Optional[str] = None
+        # Content set the templates came from, when served by a ContentRegistry (None is the default set).
+        self.content_id: Optional[str] = None
         self.current_run: Optional[ProceduralRun] = None
-        self.game_state = GameState(location="forest_clearing", inventory={}, flags=[])
+        self.game_state = RuntimeState(location="forest_clearing")
         self.starting_location = self.templates["game_settings"]["starting_location"]
+        self.item_ids_by_name = {data["name"]: item_id for item_id, data in self.templates["items"].items()}
+        self.encounters = encounter_table(self.templates)
+        self.quest_book = quest_book(self.templates)
+        self._scene_parts: Dict[str, Any] = {}
+        self._dirty: Set[str] = set(SCENE_PARTS)
 
     def load_templates(self, templates_file: str) -> dict:
         with open(templates_file, 'r') as f:
             return json.load(f)
 
     def _generate_seed(self) -> str:
-        import time
-        return hashlib.md5(str(time.time()).encode()).hexdigest()[:8]
+        return secrets.token_hex(4)
 
-    def start_new_run(self, seed: str = None) -> str:
+    def start_new_run(self, seed: str = None, world_size: int = None, region_size: int = 16) -> str:
+        """Starts a run. With world_size, synthesizes a world_size x world_size map region by region."""
         if seed is None:
             seed = self._generate_seed()
-        random.seed(seed)
-        self.current_run = ProceduralRun(seed)
+        self.current_run = self._new_run(seed)
+        if world_size is not None:
+            self.current_run.world = WorldSynthesizer(self.templates, seed, world_size, region_size=region_size)
+            start = self.current_run.world.start_location()
+            self._ensure_regions(start)
+            self.game_state = RuntimeState(location=start)
+            return f"Started new run with seed: {seed} ({world_size}x{world_size} world)"
+        self.current_run.locations = self.templates["locations"]
         self._generate_world()
-        self.game_state = GameState(location=self.starting_location, inventory={}, flags=[])
+        self.game_state = RuntimeState(location=self.starting_location)
         return f"Started new run with seed: {seed}"
 
+    def _new_run(self, seed: str) -> ProceduralRun:
+        run = ProceduralRun(seed)
+        run.quests = QuestLog(self.quest_book)
+        return run
+
+    def _ensure_regions(self, loc_id: str):
+        """Loads the regions around a synthesized location and drops far away ones."""
+        run = self.current_run
+        needed = list(run.world.regions_around(*location_coords(loc_id)))
+        for key in needed:
+            if key in run.loaded_regions:
+                run.loaded_regions.move_to_end(key)
+            else:
+                self._load_region(key)
+        needed = set(needed)
+        for key in list(run.loaded_regions):
+            if len(run.loaded_regions) <= self.max_loaded_regions:
+                break
+            if key not in needed:
+                self._unload_region(key)
+
+    def _load_region(self, key: Tuple[int, int]):
+        run = self.current_run
+        loc_ids = []
+        removed = {}
+        for location, conns, scene_items, scene_npcs in run.world.iter_region(*key):
+            loc_id = location.loc_id
+            loc_ids.append(loc_id)
+            run.locations[loc_id] = location.template
+            run.scene_connections[loc_id] = conns
+            self._spawn(loc_id, scene_items, scene_npcs)
+            if loc_id in run.removed_items:
+                removed[loc_id] = run.removed_items[loc_id]
+        run.loaded_regions[key] = loc_ids
+        self._apply_removed_items(removed)
+
+    def _unload_region(self, key: Tuple[int, int]):
+        run = self.current_run
+        for loc_id in run.loaded_regions.pop(key):
+            del run.locations[loc_id]
+            del run.scene_connections[loc_id]
+            del run.spawned_items[loc_id]
+            del run.spawned_npcs[loc_id]
+            del run.spawned_base[loc_id]
+
+    def _spawn(self, loc_id: str, scene_items: List[RuntimeItem], scene_npcs: List[RuntimeNpc]):
+        run = self.current_run
+        run.spawned_base[loc_id] = tuple(scene_items)
+        run.spawned_items[loc_id] = NameIndex(scene_items)
+        run.spawned_npcs[loc_id] = NameIndex(scene_npcs)
+
+    def export_world(self) -> Dict[str, Any]:
+        """Returns a compact, picklable blueprint of the freshly generated world of the current run."""
+        run = self.current_run
+        blueprint = {
+            "seed": run.seed,
+            "world": self._world_settings(),
+            "rng": run.rng.getstate(),
+            "start": self.game_state.location,
+            "locations": [
+                [
+                    loc_id,
+                    run.scene_connections[loc_id],
+                    [[item.item_id, item.variant] for item in run.spawned_items[loc_id]],
+                    [[npc.npc_id, npc.dialogue] for npc in run.spawned_npcs[loc_id]]
+                ]
+                for loc_id in run.scene_connections
+            ]
+        }
+        if run.world:
+            blueprint["regions"] = [[key[0], key[1], loc_ids] for key, loc_ids in run.loaded_regions.items()]
+        return blueprint
+
+    def start_from_blueprint(self, blueprint: Dict[str, Any]) -> str:
+        """Starts a run from export_world() output without generating anything."""
+        run = self._new_run(blueprint["seed"])
+        run.rng.setstate(blueprint["rng"])
+        locations = self.templates["locations"]
+        items = self.templates["items"]
+        npcs = self.templates["npcs"]
+        world = blueprint["world"]
+        if world:
+            run.world = WorldSynthesizer(self.templates, run.seed, world[0], region_size=world[1])
+        else:
+            run.locations = locations
+        for loc_id, conns, scene_items, scene_npcs in blueprint["locations"]:
+            if world:
+                run.locations[loc_id] = locations[location_template_id(loc_id)]
+            run.scene_connections[loc_id] = dict(conns)
+            run.spawned_base[loc_id] = tuple(RuntimeItem(item_id, items[item_id], variant) for item_id, variant in scene_items)
+            run.spawned_items[loc_id] = NameIndex(run.spawned_base[loc_id])
+            run.spawned_npcs[loc_id] = NameIndex(RuntimeNpc(npc_id, npcs[npc_id], dict(dialogue)) for npc_id, dialogue in scene_npcs)
+        for rx, ry, loc_ids in blueprint.get("regions", []):
+            run.loaded_regions[(rx, ry)] = list(loc_ids)
+        self.current_run = run
+        self.game_state = RuntimeState(location=blueprint["start"])
+        if world:
+            return f"Started new run with seed: {run.seed} ({world[0]}x{world[0]} world)"
+        return f"Started new run with seed: {run.seed}"
+
+    def _world_settings(self) -> Optional[List[int]]:
+        world = self.current_run.world
+        return [world.width, world.region_size] if world else None
+
+    def _restart_run(self, seed: str, world: Optional[List[int]]):
+        if world:
+            self.start_new_run(seed, world_size=world[0], region_size=world[1])
+        else:
+            self.start_new_run(seed)
+
     def _generate_world(self):
         locations = self.templates["locations"]
         items = self.templates["items"]
@@ -51,52 +256,15 @@ class ProceduralStoryEngine:
             for item_id in loc_data.get("items", []):
                 item_data = items.get(item_id)
                 if item_data:
-                    desc = item_data["description"]
-                    if random.random() < 0.3:
-                        desc += f" (It seems {random.choice(['unusually heavy', 'slightly magical', 'well-used', 'brand new'])}.)"
-                    scene_items.append(Item(
-                        name=item_data["name"],
-                        description=desc,
-                        properties=item_data["properties"]
-                    ))
-            self.current_run.spawned_items[loc_id] = scene_items
+                    scene_items.append(spawn_item(item_id, item_data, self.current_run.rng))
 
             # NPCs
             scene_npcs = []
             for npc_id in loc_data.get("npcs", []):
                 npc_data = npcs.get(npc_id)
                 if npc_data:
-                    dialogue = dict(npc_data.get("dialogue", {}))
-                    if "greeting" in dialogue:
-                        dialogue["greeting"] += " " + random.choice([
-                            "What brings you here?",
-                            "You look like you have questions.",
-                            "The forest is full of secrets.",
-                            "Be wary of the shadows."
-                        ])
-                    if "quest" in dialogue and random.random() < 0.5:
-                        dialogue["quest"] += " " + random.choice([
-                            "Will you accept this challenge?",
-                            "It's not for the faint of heart.",
-                            "Legends say only the brave succeed."
-                        ])
-                    scene_npcs.append({
-                        "name": npc_data["name"],
-                        "description": npc_data["description"],
-                        "personality": npc_data.get("personality", ""),
-                        "dialogue": dialogue,
-                        "quests": npc_data.get("quests", []),
-                        "trades": npc_data.get("trades", {})
-                    })
-            self.current_run.spawned_npcs[loc_id] = scene_npcs
-
-            # Scene object
-            self.current_run.generated_scenes[loc_id] = Scene(
-                id=loc_id,
-                descriptions=[{"text": loc_data["description"]}],
-                items=scene_items,
-                choices=[]
-            )
+                    scene_npcs.append(spawn_npc(npc_id, npc_data, self.current_run.rng))
+            self._spawn(loc_id, scene_items, scene_npcs)
 
             # Connections
             self.current_run.scene_connections[loc_id] = dict(loc_data.get("connections", {}))
@@ -129,86 +297,258 @@ class ProceduralStoryEngine:
         if not self.current_run:
             return {"error": "No run active. Start a new run first."}
         current_location = self.game_state.location
-        scene = self.current_run.generated_scenes.get(current_location)
-        self.current_run.visited_scenes.add(current_location)
+        self.current_run.visited_scenes = self.current_run.visited_scenes.add(current_location)
         if not self.current_run.location_history or self.current_run.location_history[-1] != current_location:
-            self.current_run.location_history.append(current_location)
-            if len(self.current_run.location_history) > 10:
-                self.current_run.location_history = self.current_run.location_history[-10:]
-        choices = []
-        conns = self.current_run.scene_connections.get(current_location, {})
-        for direction, target in conns.items():
-            loc_name = self.templates["locations"][target]["name"]
-            choices.append(f"go {direction} ({loc_name})")
-        for item in self.current_run.spawned_items.get(current_location, []):
-            choices.append(f"take {item.name.lower()}")
-        for npc in self.current_run.spawned_npcs.get(current_location, []):
-            choices.append(f"talk to {npc['name'].lower()}")
+            self.current_run.location_history = self.current_run.location_history[-9:] + (current_location,)
+        parts = self._scene_parts
+        if parts.get("run") is not self.current_run or parts.get("location") != current_location:
+            self._scene_parts = parts = {"run": self.current_run, "location": current_location}
+            self._dirty.update(SCENE_PARTS)
+        if "exits" in self._dirty:
+            loc_data = self.current_run.locations.get(current_location)
+            parts["description"] = loc_data["description"] if loc_data else "You are somewhere unknown."
+            conns = self.current_run.scene_connections.get(current_location, {})
+            parts["exits"] = [f"go {direction} ({self.current_run.locations[target]['name']})" for direction, target in conns.items()]
+        if "contents" in self._dirty:
+            items = self.current_run.spawned_items.get(current_location, [])
+            npcs = self.current_run.spawned_npcs.get(current_location, [])
+            parts["items"] = [item.name for item in items]
+            parts["npcs"] = [npc.name for npc in npcs]
+            parts["actions"] = [f"take {name.lower()}" for name in parts["items"]] + [f"talk to {name.lower()}" for name in parts["npcs"]]
+        if "exits" in self._dirty or "contents" in self._dirty:
+            parts["choices"] = parts["exits"] + parts["actions"]
+        if "inventory" in self._dirty:
+            parts["inventory"] = list(self.game_state.inventory.keys())
+        self._dirty.clear()
         return {
             "scene_id": current_location,
-            "description": scene.descriptions[0]['text'] if scene and scene.descriptions else "You are somewhere unknown.",
-            "items": [item.name for item in self.current_run.spawned_items.get(current_location, [])],
-            "npcs": [npc["name"] for npc in self.current_run.spawned_npcs.get(current_location, [])],
-            "choices": choices,
-            "inventory": list(self.game_state.inventory.keys()),
+            "description": parts["description"],
+            "items": parts["items"],
+            "npcs": parts["npcs"],
+            "choices": parts["choices"],
+            "inventory": parts["inventory"],
             "seed": self.current_run.seed,
             "visited_scenes": len(self.current_run.visited_scenes),
             "current_conversation": getattr(self.game_state, "current_conversation", None)
         }
 
+    def _touch(self, *parts: str):
+        """Marks parts of the scene data as changed so the next get_current_scene_data() rebuilds them."""
+        self._dirty.update(parts)
+
     def process_command(self, command: str) -> str:
-        command = command.lower().strip()
-        current_location = self.game_state.location
+        verb, argument = self.commands.parse(command.strip())
+        if verb is None:
+            return "I don't understand that command."
+        if self.current_run is None:
+            if verb in HISTORY_VERBS:
+                return "No run active. Start a new run first."
+            return self.commands.handler(verb)(self, argument)
+        before = self.snapshot() if verb not in HISTORY_VERBS else None
+        result = self.commands.handler(verb)(self, argument)
+        if before is not None and self._changed_since(before):
+            self.current_run.undo.append(before)
+        return result
 
-        # Movement
-        if command.startswith("go "):
-            parts = command.split()
-            if len(parts) < 2:
-                return "Go where?"
-            direction = parts[1]
-            conns = self.current_run.scene_connections.get(current_location, {})
-            if direction in conns:
-                self.game_state.location = conns[direction]
-                return f"You go {direction} to {self.templates['locations'][conns[direction]]['name']}."
+    @commands.register("go")
+    def _cmd_go(self, argument: str) -> str:
+        parts = argument.split()
+        if not parts:
+            return "Go where?"
+        direction = parts[0]
+        conns = self.current_run.scene_connections.get(self.game_state.location, {})
+        if direction not in conns:
             return "You can't go that way."
+        self.game_state.location = conns[direction]
+        if self.current_run.world:
+            self._ensure_regions(self.game_state.location)
+        message = f"You go {direction} to {self.current_run.locations[conns[direction]]['name']}."
+        encounter = self._roll_encounter()
+        if encounter:
+            message += " " + encounter
+        return self._with_quest_updates(message, LOCATION_ENTERED, location_template_id(self.game_state.location))
 
-        # Take item
-        if command.startswith("take "):
-            item_name = command[5:].strip().lower()
-            items = self.current_run.spawned_items.get(current_location, [])
-            for item in items:
-                if item.name.lower() == item_name:
-                    self.game_state.inventory[item.name] = item
-                    items.remove(item)
-                    return f"You take the {item.name}."
+    @commands.register("take")
+    def _cmd_take(self, item_name: str) -> str:
+        current_location = self.game_state.location
+        items = self.current_run.spawned_items.get(current_location)
+        item = items.pop(item_name) if items else None
+        if item is None:
             return f"No {item_name} here to take."
+        self.game_state.inventory = self.game_state.inventory.set(item.name, item)
+        removed = self.current_run.removed_items
+        self.current_run.removed_items = removed.set(current_location, removed.get(current_location, ()) + (item.name,))
+        self._touch("contents", "inventory")
+        return self._with_quest_updates(f"You take the {item.name}.", ITEM_TAKEN, item.item_id)
 
-        # Talk to NPC
-        if command.startswith("talk to "):
-            npc_name = command[8:].strip().lower()
-            npcs = self.current_run.spawned_npcs.get(current_location, [])
-            for npc in npcs:
-                if npc["name"].lower() == npc_name:
-                    self.game_state.current_conversation = npc["name"]
-                    greeting = npc["dialogue"].get("greeting", "They greet you.")
-                    return f"{npc['name']}: \"{greeting}\""
+    @commands.register("talk to")
+    def _cmd_talk(self, npc_name: str) -> str:
+        npcs = self.current_run.spawned_npcs.get(self.game_state.location)
+        npc = npcs.find(npc_name) if npcs else None
+        if npc is None:
             return f"No {npc_name} here to talk to."
+        self.game_state.current_conversation = npc.name
+        greeting = npc.dialogue.get("greeting", "They greet you.")
+        message = self._with_quest_updates(f"{npc.name}: \"{greeting}\"", NPC_TALKED, npc.npc_id)
+        for quest_id in self.quest_book.givers.get(npc.npc_id, []):
+            if self.current_run.quests.start(quest_id):
+                message += f" New quest: {self.quest_book.quests[quest_id]['title']}."
+        return message
+
+    @commands.register("inventory")
+    def _cmd_inventory(self, argument: str) -> str:
+        if not self.game_state.inventory:
+            return "You aren't carrying anything."
+        return "You are carrying: " + ", ".join(self.game_state.inventory.keys())
+
+    @commands.register("bye", "goodbye", "leave", "exit", "end", "farewell")
+    def _cmd_bye(self, argument: str) -> str:
+        if getattr(self.game_state, "current_conversation", None):
+            npc_name = self.game_state.current_conversation
+            self.game_state.current_conversation = ""
+            return f"You end your conversation with {npc_name}."
+        return "You are not talking to anyone."
 
-        # Inventory
-        if command == "inventory":
-            if not self.game_state.inventory:
-                return "You aren't carrying anything."
-            return "You are carrying: " + ", ".join(self.game_state.inventory.keys())
+    @commands.register("undo")
+    def _cmd_undo(self, argument: str) -> str:
+        if not self.current_run.undo:
+            return "There is nothing to undo."
+        self.restore(self.current_run.undo.pop())
+        return f"You take back your last action. You are at {self.current_run.locations[self.game_state.location]['name']}."
 
-        # End conversation
-        if command in ["bye", "goodbye", "leave", "exit", "end", "farewell"]:
-            if getattr(self.game_state, "current_conversation", None):
-                npc_name = self.game_state.current_conversation
-                self.game_state.current_conversation = ""
-                return f"You end your conversation with {npc_name}."
-            return "You are not talking to anyone."
+    @commands.register("checkpoint")
+    def _cmd_checkpoint(self, name: str) -> str:
+        if not name:
+            return "Name the checkpoint, for example: checkpoint before the cave."
+        checkpoints = self.current_run.checkpoints
+        checkpoints.pop(name, None)
+        checkpoints[name] = self.snapshot()
+        if len(checkpoints) > self.max_checkpoints:
+            del checkpoints[next(iter(checkpoints))]
+        return f"Checkpoint '{name}' saved."
 
-        return "I don't understand that command."
+    @commands.register("restore")
+    def _cmd_restore(self, name: str) -> str:
+        snapshot = self.current_run.checkpoints.get(name)
+        if snapshot is None:
+            return f"There is no checkpoint named '{name}'."
+        self.current_run.undo.append(self.snapshot())
+        self.restore(snapshot)
+        return f"Restored checkpoint '{name}'. You are at {self.current_run.locations[self.game_state.location]['name']}."
+
+    def snapshot(self) -> RuntimeSnapshot:
+        """Captures the state of the current run. Cheap enough to take before every command."""
+        return RuntimeSnapshot(self.current_run, self.game_state)
+
+    def restore(self, snapshot: RuntimeSnapshot):
+        """Returns the current run to a snapshot taken from it, world changes included.
+
+        Snapshots can be restored in any order, so a run can be branched and
+        the branches revisited.
+        """
+        run = self.current_run
+        if snapshot.run is not run:
+            raise ValueError("The snapshot was taken from a different run")
+        state = self.game_state
+        state.location, state.current_conversation, state.player_name, state.player_class = snapshot.state
+        state.inventory = snapshot.inventory
+        state.flags = snapshot.flags
+        run.visited_scenes = snapshot.visited
+        run.location_history = snapshot.history
+        run.moves = snapshot.moves
+        run.quests.restore_snapshot(snapshot.quests)
+        changed = run.removed_items.changed_keys(snapshot.removed)
+        run.removed_items = snapshot.removed
+        for loc_id in changed:
+            base = run.spawned_base.get(loc_id)
+            if base is not None:
+                items = NameIndex(base)
+                for name in snapshot.removed.get(loc_id, ()):
+                    items.pop(name.lower())
+                run.spawned_items[loc_id] = items
+        if run.world:
+            self._ensure_regions(state.location)
+        self._touch(*SCENE_PARTS)
+
+    def _changed_since(self, snapshot: RuntimeSnapshot) -> bool:
+        run = self.current_run
+        state = self.game_state
+        return (
+            snapshot.state[0] != state.location
+            or snapshot.state[1] != state.current_conversation
+            or snapshot.moves != run.moves
+            or snapshot.removed is not run.removed_items
+            or snapshot.inventory is not state.inventory
+            or snapshot.flags is not state.flags
+            or run.quests.changed_since(snapshot.quests)
+        )
+
+    def _with_quest_updates(self, message: str, event: str, target: Optional[str]) -> str:
+        """Feeds an event to the quest log and appends any progress to the message."""
+        if target is None:
+            return message
+        updates, finished = self.current_run.quests.emit(event, target)
+        parts = [message] + updates
+        for quest_id in finished:
+            quest = self.quest_book.quests[quest_id]
+            parts.append(f"Quest complete: {quest['title']}!")
+            found = self._grant_rewards(quest.get("rewards", []))
+            if found:
+                parts.append(f"You gain: {', '.join(found)}.")
+        return " ".join(parts)
+
+    def _grant_rewards(self, rewards: List[str]) -> List[str]:
+        """Adds reward items to the inventory and other rewards as flags; returns the item names."""
+        found = []
+        for reward in rewards:
+            item_data = self.templates["items"].get(reward)
+            if item_data:
+                self.game_state.inventory = self.game_state.inventory.set(item_data["name"], RuntimeItem(reward, item_data))
+                found.append(item_data["name"])
+                self._touch("inventory")
+            elif reward not in self.game_state.flags:
+                self.game_state.flags += (reward,)
+        return found
+
+    def _roll_encounter(self) -> Optional[str]:
+        """Draws an encounter for the location just entered and applies its outcome."""
+        run = self.current_run
+        run.moves += 1
+        template_id = location_template_id(self.game_state.location)
+        if template_id not in self.encounters.tables:
+            return None
+        rng = random.Random(f"{run.seed}:move:{run.moves}")
+        enc_id = self.encounters.draw(template_id, rng)
+        if enc_id is None:
+            return None
+        encounter = self.encounters.encounters[enc_id]
+        if not meets_requirements(encounter, self.game_state.inventory):
+            return None
+        success, text = resolve(encounter, rng)
+        parts = [f"{encounter['name']}! {encounter['description']}"]
+        if text:
+            parts.append(text)
+        if success:
+            found = self._grant_rewards(encounter.get("rewards", []))
+            if found:
+                parts.append(f"You gain: {', '.join(found)}.")
+        return " ".join(parts)
+
+    def run_save_data(self) -> Dict[str, Any]:
+        """Returns the contents of a save file for the current run, as read by load_run()."""
+        return {
+            "seed": self.current_run.seed,
+            "world": self._world_settings(),
+            "game_state": {
+                "location": self.game_state.location,
+                "inventory": {k: v.to_model().dict() for k, v in self.game_state.inventory.items()},
+                "flags": list(self.game_state.flags)
+            },
+            "visited_scenes": sorted(self.current_run.visited_scenes),
+            "removed_items": self._removed_items_dict(),
+            "moves": self.current_run.moves,
+            "quests": self.current_run.quests.export()
+        }
 
     def save_run(self, filename: str = None) -> str:
         import datetime
@@ -217,34 +557,175 @@ class ProceduralStoryEngine:
         if filename is None:
             now = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
             filename = f"save_{now}.json"
-        save_data = {
-            "seed": self.current_run.seed,
-            "game_state": {
-                "location": self.game_state.location,
-                "inventory": {k: v.dict() for k, v in self.game_state.inventory.items()},
-                "flags": self.game_state.flags
-            },
-            "visited_scenes": list(self.current_run.visited_scenes)
-        }
-        with open(filename, 'w') as f:
-            json.dump(save_data, f, indent=2)
+        write_atomic(filename, json.dumps(self.run_save_data(), indent=2))
         return f"Run saved to {filename}"
 
     def load_run(self, filename: str) -> str:
         try:
             with open(filename, 'r') as f:
                 save_data = json.load(f)
-            self.start_new_run(save_data["seed"])
-            self.game_state.location = save_data["game_state"]["location"]
-            self.game_state.flags = save_data["game_state"]["flags"]
-            for item_name, item_data in save_data["game_state"]["inventory"].items():
-                item = Item(**item_data)
-                self.game_state.inventory[item_name] = item
-            self.current_run.visited_scenes = set(save_data["visited_scenes"])
+            self.load_save_data(save_data)
             return f"Run loaded from {filename}"
         except Exception as e:
             return f"Failed to load run: {e}"
 
+    def load_save_data(self, save_data: Dict[str, Any]):
+        """Replaces the current run with the contents of a save file (see run_save_data())."""
+        self._restart_run(save_data["seed"], save_data.get("world"))
+        self.game_state.location = save_data["game_state"]["location"]
+        if self.current_run.world:
+            self._ensure_regions(self.game_state.location)
+        self.game_state.flags = tuple(save_data["game_state"]["flags"])
+        for item_name, item_data in save_data["game_state"]["inventory"].items():
+            item = Item(**item_data)
+            self.game_state.inventory = self.game_state.inventory.set(
+                item_name, RuntimeItem.from_model(item, self.item_ids_by_name, self.templates["items"]))
+        self.current_run.visited_scenes = PSet(save_data["visited_scenes"])
+        self._apply_removed_items(save_data.get("removed_items", {}))
+        self.current_run.moves = save_data.get("moves", 0)
+        self.current_run.quests.restore(save_data.get("quests", {}))
+
+    def _apply_removed_items(self, removed_items: Dict[str, List[str]]):
+        run = self.current_run
+        for loc_id, names in removed_items.items():
+            items = run.spawned_items.get(loc_id)
+            if items:
+                for name in names:
+                    items.pop(name.lower())
+            names = tuple(names)
+            if run.removed_items.get(loc_id) != names:
+                run.removed_items = run.removed_items.set(loc_id, names)
+
+    def _removed_items_dict(self) -> Dict[str, List[str]]:
+        return {loc_id: list(names) for loc_id, names in sorted(self.current_run.removed_items.items())}
+
+    def export_state(self) -> Dict[str, Any]:
+        """Returns the minimal state needed to rebuild this run: the seed plus the run delta.
+
+        Undo snapshots are stored as the differences between each one and the
+        next, and checkpoints as their differences from the current state, so
+        undo and restore keep working on whichever worker loads the run.
+        """
+        if not self.current_run:
+            return {}
+        current = base = self.snapshot()
+        undo = []
+        for snapshot in reversed(self.current_run.undo):
+            undo.append(self._export_snapshot(snapshot, base))
+            base = snapshot
+        undo.reverse()
+        return {
+            "seed": self.current_run.seed,
+            "world": self._world_settings(),
+            "location": self.game_state.location,
+            "inventory": self._export_inventory(self.game_state.inventory),
+            "flags": list(self.game_state.flags),
+            "conversation": self.game_state.current_conversation,
+            "player": [self.game_state.player_name, self.game_state.player_class],
+            "visited": sorted(self.current_run.visited_scenes),
+            "history": list(self.current_run.location_history),
+            "removed": self._removed_items_dict(),
+            "moves": self.current_run.moves,
+            "quests": self.current_run.quests.export(),
+            "undo": undo,
+            "checkpoints": [[name, self._export_snapshot(snapshot, current)]
+                            for name, snapshot in self.current_run.checkpoints.items()]
+        }
+
+    def import_state(self, state: Dict[str, Any]):
+        """Rebuilds a run from the output of export_state()."""
+        if not state:
+            self.current_run = None
+            return
+        self._restart_run(state["seed"], state.get("world"))
+        self.game_state.location = state["location"]
+        self.game_state.flags = tuple(state["flags"])
+        self.game_state.current_conversation = state["conversation"]
+        self.game_state.player_name, self.game_state.player_class = state["player"]
+        self.game_state.inventory = self._import_inventory(state["inventory"])
+        self.current_run.visited_scenes = PSet(state["visited"])
+        self.current_run.location_history = tuple(state["history"])
+        self._apply_removed_items(state["removed"])
+        self.current_run.moves = state.get("moves", 0)
+        self.current_run.quests.restore(state.get("quests", {}))
+        if self.current_run.world:
+            self._ensure_regions(self.game_state.location)
+        current = base = self.snapshot()
+        undo = []
+        for delta in reversed(state.get("undo", ())):
+            base = self._import_snapshot(delta, base)
+            undo.append(base)
+        self.current_run.undo.extend(reversed(undo))
+        for name, delta in state.get("checkpoints", ()):
+            self.current_run.checkpoints[name] = self._import_snapshot(delta, current)
+
+    def _export_inventory(self, inventory: POrderedMap) -> List[list]:
+        return [
+            [i.item_id, i.variant] if i.item_id is not None else [None, i.name, i.description, i.properties]
+            for i in inventory.values()
+        ]
+
+    def _import_inventory(self, entries: List[list]) -> POrderedMap:
+        inventory = POrderedMap()
+        for entry in entries:
+            if entry[0] is not None:
+                item = RuntimeItem(entry[0], self.templates["items"][entry[0]], entry[1])
+            else:
+                item = RuntimeItem(None, {"name": entry[1], "description": entry[2], "properties": entry[3]})
+            inventory = inventory.set(item.name, item)
+        return inventory
+
+    def _export_snapshot(self, snapshot: RuntimeSnapshot, base: RuntimeSnapshot) -> Dict[str, Any]:
+        """Encodes a snapshot as its differences from `base`, another snapshot of the same run.
+
+        Snapshots never change, so the delta is kept and reused while the
+        snapshot is saved against the same base, as undo entries are.
+        """
+        if snapshot.encoded is not None and snapshot.encoded[0] is base:
+            return snapshot.encoded[1]
+        delta = {"state": list(snapshot.state), "moves": snapshot.moves}
+        if snapshot.inventory is not base.inventory and snapshot.inventory != base.inventory:
+            delta["inventory"] = self._export_inventory(snapshot.inventory)
+        if snapshot.flags != base.flags:
+            delta["flags"] = list(snapshot.flags)
+        if snapshot.history != base.history:
+            delta["history"] = history_delta(snapshot.history, base.history)
+        # Locations visited in one of the two snapshots but not the other
+        visited = snapshot.visited.changed_items(base.visited)
+        if visited:
+            delta["visited"] = sorted(visited)
+        removed = snapshot.removed.changed_keys(base.removed)
+        if removed:
+            delta["removed"] = {loc_id: list(snapshot.removed.get(loc_id, ())) for loc_id in sorted(removed)}
+        quests = self.current_run.quests.snapshot_delta(snapshot.quests, base.quests)
+        if quests is not None:
+            delta["quests"] = quests
+        snapshot.encoded = (base, delta)
+        return delta
+
+    def _import_snapshot(self, delta: Dict[str, Any], base: RuntimeSnapshot) -> RuntimeSnapshot:
+        """Rebuilds a snapshot from the output of _export_snapshot() and the same base."""
+        changes = {"state": tuple(delta["state"]), "moves": delta["moves"]}
+        if "inventory" in delta:
+            changes["inventory"] = self._import_inventory(delta["inventory"])
+        if "flags" in delta:
+            changes["flags"] = tuple(delta["flags"])
+        if "history" in delta:
+            changes["history"] = apply_history_delta(delta["history"], base.history)
+        if "visited" in delta:
+            visited = base.visited
+            for loc_id in delta["visited"]:
+                visited = visited.discard(loc_id) if loc_id in visited else visited.add(loc_id)
+            changes["visited"] = visited
+        if "removed" in delta:
+            removed = base.removed
+            for loc_id, names in delta["removed"].items():
+                removed = removed.set(loc_id, tuple(names)) if names else removed.delete(loc_id)
+            changes["removed"] = removed
+        if "quests" in delta:
+            changes["quests"] = self.current_run.quests.apply_snapshot_delta(delta["quests"], base.quests)
+        return base.replace(**changes)
+
     def list_saves(self) -> List[str]:
         import os
         save_files = []
@@ -0,0 +1,311 @@
+# core/quests.py
+#
+# Quest tracking driven by engine events. Each quest's current objective
+# subscribes to one (event, target) key, and emitting an event only visits
+# the objectives indexed under that key. Objectives without a target, such
+# as "explore the area", count events of their kind instead and are only
+# visited when they complete, so the cost of a command does not depend on
+# how many quests are active.
+
+import heapq
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from .persistent import PMap, POrderedMap, PSet
+
+ITEM_TAKEN = "item_taken"
+LOCATION_ENTERED = "location_entered"
+NPC_TALKED = "npc_talked"
+# Event of objectives the text parser could not make sense of; never emitted.
+UNPARSED = "unparsed"
+
+NUMBER_WORDS = {"two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10}
+
+# Verbs used to guess the event of free-text objectives, checked in order.
+OBJECTIVE_VERBS = (
+    (NPC_TALKED, ("talk", "speak", "report", "return", "ask")),
+    (ITEM_TAKEN, ("collect", "gather", "locate", "retrieve", "obtain", "take")),
+    (LOCATION_ENTERED, ("explore", "investigate", "find", "visit", "reach", "enter"))
+)
+
+# Compiled tables by templates dict, enough for every content set and old
+# template version still in use to stay compiled.
+MAX_COMPILED = 64
+_books: Dict[int, Tuple[dict, "QuestBook"]] = {}
+# Taken to compile or evict, since sessions run on worker threads.
+_compile_lock = threading.Lock()
+
+class Objective:
+    __slots__ = ("text", "event", "target", "count")
+
+    def __init__(self, text: str, event: str, target: Optional[str] = None, count: int = 1):
+        self.text = text
+        self.event = event
+        self.target = target
+        self.count = count
+
+def _named(text: str, table: Dict[str, dict]) -> Optional[str]:
+    for entry_id, data in table.items():
+        if data.get("name", "").lower() in text or entry_id.replace("_", " ") in text:
+            return entry_id
+    return None
+
+def compile_objective(objective: Any, templates: dict) -> Objective:
+    """Turns a template objective into an Objective.
+
+    Objectives can be written as {"text", "event", "target", "count"}. Plain
+    strings are matched against NPC, item and location names, falling back
+    to the verb for an objective that any matching event completes. Strings
+    with neither get the UNPARSED event and are logged.
+    """
+    if isinstance(objective, dict):
+        return Objective(objective.get("text", ""), objective["event"], objective.get("target"), objective.get("count", 1))
+    text = objective.lower()
+    words = re.findall(r"[a-z]+", text)
+    count = next((NUMBER_WORDS[w] for w in words if w in NUMBER_WORDS), 1)
+    npc_id = _named(text, templates.get("npcs", {}))
+    if npc_id:
+        return Objective(objective, NPC_TALKED, npc_id, count)
+    item_id = _named(text, templates.get("items", {}))
+    if item_id:
+        return Objective(objective, ITEM_TAKEN, item_id, count)
+    loc_id = _named(text, templates.get("locations", {}))
+    if loc_id:
+        return Objective(objective, LOCATION_ENTERED, loc_id, count)
+    for event, verbs in OBJECTIVE_VERBS:
+        if any(w in verbs for w in words):
+            return Objective(objective, event, None, count)
+    # Nothing is emitted for UNPARSED, so the objective waits instead of
+    # completing on whatever happens next.
+    print(f"Quest objective not understood, it cannot be completed: '{objective}'")
+    return Objective(objective, UNPARSED, None, count)
+
+class QuestBook:
+    """Compiled quests and the quests each NPC gives out."""
+
+    def __init__(self, templates: dict):
+        self.quests: Dict[str, dict] = templates.get("quests", {})
+        self.objectives: Dict[str, List[Objective]] = {
+            quest_id: [compile_objective(o, templates) for o in quest.get("objectives", [])]
+            for quest_id, quest in self.quests.items()
+        }
+        self.givers: Dict[str, List[str]] = {
+            npc_id: [q for q in npc.get("quests", []) if q in self.quests]
+            for npc_id, npc in templates.get("npcs", {}).items()
+        }
+
+def quest_book(templates: dict) -> QuestBook:
+    """Returns the compiled quest book for a templates dict, compiling it on first use."""
+    entry = _books.get(id(templates))
+    if entry is None or entry[0] is not templates:
+        with _compile_lock:
+            entry = _books.get(id(templates))
+            if entry is None or entry[0] is not templates:
+                entry = (templates, QuestBook(templates))
+                _books[id(templates)] = entry
+                if len(_books) > MAX_COMPILED:
+                    del _books[next(iter(_books))]
+    return entry[1]
+
+def forget_compiled(templates: dict):
+    """Drops the compiled copy of a templates dict that is no longer served."""
+    with _compile_lock:
+        entry = _books.get(id(templates))
+        if entry is not None and entry[0] is templates:
+            del _books[id(templates)]
+
+class QuestLog:
+    """Per-run quest progress plus the subscription index for active objectives.
+
+    Objectives with a target wait under (event, target) in the index and
+    count their progress as matching events arrive. Objectives without one
+    would be visited by every event of their kind, so instead the log counts
+    events per kind and each such objective records the count it started
+    at; its progress is worked out when asked for, and a heap per event
+    holds the counts at which they complete, so an event only touches the
+    objectives it completes.
+
+    Everything is held in persistent maps and tuples, replaced rather than
+    changed in place, so snapshot() is a reference to the current ones and
+    costs the same however many quests are active.
+    """
+
+    def __init__(self, book: QuestBook):
+        self.book = book
+        # quest id -> (objective index, progress, event count at which that
+        # progress was recorded or None for targeted objectives), in the order started
+        self.active = POrderedMap()
+        # quest id -> True, in the order the quests were completed
+        self.completed = POrderedMap()
+        # (event, target) -> PSet of quest ids waiting on it
+        self._index = PMap()
+        # event -> number emitted
+        self._counts = PMap()
+        # event -> heap tuple of (event count completing the objective, quest id)
+        self._thresholds = PMap()
+
+    def _objective(self, quest_id: str, step: int) -> Objective:
+        return self.book.objectives[quest_id][step]
+
+    def _progress(self, quest_id: str, state: tuple, counts: Optional[PMap] = None) -> int:
+        step, progress, start = state
+        if start is None:
+            return progress
+        counts = self._counts if counts is None else counts
+        return progress + counts.get(self._objective(quest_id, step).event, 0) - start
+
+    def _subscribe(self, quest_id: str, step: int, progress: int = 0):
+        objective = self._objective(quest_id, step)
+        if objective.target is None:
+            start = self._counts.get(objective.event, 0)
+            heap = list(self._thresholds.get(objective.event, ()))
+            heapq.heappush(heap, (start + objective.count - progress, quest_id))
+            self._thresholds = self._thresholds.set(objective.event, tuple(heap))
+            self.active = self.active.set(quest_id, (step, progress, start))
+            return
+        key = (objective.event, objective.target)
+        self._index = self._index.set(key, self._index.get(key, PSet()).add(quest_id))
+        self.active = self.active.set(quest_id, (step, progress, None))
+
+    def _unsubscribe(self, quest_id: str, step: int):
+        objective = self._objective(quest_id, step)
+        if objective.target is None:
+            heap = [entry for entry in self._thresholds.get(objective.event, ()) if entry[1] != quest_id]
+            heapq.heapify(heap)
+            self._thresholds = self._thresholds.set(objective.event, tuple(heap)) if heap else self._thresholds.delete(objective.event)
+            return
+        key = (objective.event, objective.target)
+        subscribers = self._index.get(key)
+        if subscribers is not None:
+            subscribers = subscribers.discard(quest_id)
+            self._index = self._index.set(key, subscribers) if subscribers else self._index.delete(key)
+
+    def start(self, quest_id: str) -> bool:
+        if quest_id in self.active or quest_id in self.completed or quest_id not in self.book.quests:
+            return False
+        if not self.book.objectives[quest_id]:
+            self.completed = self.completed.set(quest_id, True)
+            return True
+        self._subscribe(quest_id, 0)
+        return True
+
+    def _advance(self, quest_id: str, step: int, messages: List[str], finished: List[str]):
+        """Completes the current objective of a quest and subscribes its next one."""
+        objective = self._objective(quest_id, step)
+        messages.append(f"[{self.book.quests[quest_id]['title']}] Objective complete: {objective.text}")
+        if step + 1 < len(self.book.objectives[quest_id]):
+            self._subscribe(quest_id, step + 1)
+        else:
+            self.active = self.active.delete(quest_id)
+            self.completed = self.completed.set(quest_id, True)
+            finished.append(quest_id)
+
+    def emit(self, event: str, target: str) -> Tuple[List[str], List[str]]:
+        """Applies an event; returns (progress messages, ids of quests it completed).
+
+        Objectives without a target only report when they complete.
+        """
+        messages = []
+        finished = []
+        for quest_id in list(self._index.get((event, target), ())):
+            state = self.active.get(quest_id)
+            if state is None:
+                continue
+            step, progress = state[0], state[1] + 1
+            objective = self._objective(quest_id, step)
+            if progress < objective.count:
+                self.active = self.active.set(quest_id, (step, progress, None))
+                messages.append(f"[{self.book.quests[quest_id]['title']}] {objective.text} ({progress}/{objective.count})")
+                continue
+            self._unsubscribe(quest_id, step)
+            self._advance(quest_id, step, messages, finished)
+        count = self._counts.get(event, 0) + 1
+        self._counts = self._counts.set(event, count)
+        heap = self._thresholds.get(event)
+        if heap and heap[0][0] <= count:
+            heap = list(heap)
+            done = []
+            while heap and heap[0][0] <= count:
+                done.append(heapq.heappop(heap)[1])
+            self._thresholds = self._thresholds.set(event, tuple(heap)) if heap else self._thresholds.delete(event)
+            for quest_id in done:
+                self._advance(quest_id, self.active[quest_id][0], messages, finished)
+        return messages, finished
+
+    def snapshot(self) -> tuple:
+        return (self.active, self.completed, self._index, self._counts, self._thresholds)
+
+    def restore_snapshot(self, snapshot: tuple):
+        self.active, self.completed, self._index, self._counts, self._thresholds = snapshot
+
+    def changed_since(self, snapshot: tuple) -> bool:
+        return snapshot[0] is not self.active or snapshot[1] is not self.completed
+
+    def export(self) -> Dict[str, Any]:
+        return self.export_snapshot(self.snapshot())
+
+    def export_snapshot(self, snapshot: tuple) -> Dict[str, Any]:
+        active, completed, counts = snapshot[0], snapshot[1], snapshot[3]
+        return {
+            "active": {quest_id: [state[0], self._progress(quest_id, state, counts)] for quest_id, state in active.items()},
+            "completed": list(completed)
+        }
+
+    def snapshot_from(self, state: Dict[str, Any]) -> tuple:
+        """Builds a snapshot from the output of export_snapshot(), leaving this log unchanged."""
+        log = QuestLog(self.book)
+        log.restore(state)
+        return log.snapshot()
+
+    def snapshot_delta(self, snapshot: tuple, base: tuple) -> Optional[Dict[str, Any]]:
+        """Encodes a snapshot against another snapshot of this log; None when they are the same.
+
+        Between snapshots that only saw events, this is the number of events
+        of each kind, as the objectives counting them are unchanged.
+        """
+        if snapshot[0] is base[0] and snapshot[1] is base[1]:
+            counts, base_counts = snapshot[3], base[3]
+            if counts is base_counts:
+                return None
+            events = {event: counts.get(event, 0) - base_counts.get(event, 0)
+                      for event in sorted(counts.changed_keys(base_counts))}
+            return {"events": events}
+        return self.export_snapshot(snapshot)
+
+    def apply_snapshot_delta(self, delta: Dict[str, Any], base: tuple) -> tuple:
+        """Rebuilds a snapshot from the output of snapshot_delta() and the same base."""
+        if "events" not in delta:
+            return self.snapshot_from(delta)
+        counts = base[3]
+        for event, added in delta["events"].items():
+            counts = counts.set(event, counts.get(event, 0) + added)
+        return base[:3] + (counts,) + base[4:]
+
+    def restore(self, state: Dict[str, Any]):
+        self.active = POrderedMap()
+        self._index = PMap()
+        self._counts = PMap()
+        self._thresholds = PMap()
+        self.completed = POrderedMap((quest_id, True) for quest_id in state.get("completed", []))
+        for quest_id, (step, progress) in state.get("active", {}).items():
+            if quest_id in self.book.quests and step < len(self.book.objectives[quest_id]):
+                self._subscribe(quest_id, step, progress)
+
+    def describe(self) -> Dict[str, Any]:
+        active = []
+        for quest_id, state in self.active.items():
+            step = state[0]
+            quest = self.book.quests[quest_id]
+            objective = self._objective(quest_id, step)
+            active.append({
+                "id": quest_id,
+                "title": quest["title"],
+                "description": quest.get("description", ""),
+                "objective": objective.text,
+                "progress": self._progress(quest_id, state),
+                "required": objective.count,
+                "step": step + 1,
+                "steps": len(self.book.objectives[quest_id])
+            })
+        completed = [{"id": q, "title": self.book.quests[q]["title"]} for q in self.completed if q in self.book.quests]
+        return {"active": active, "completed": completed}
@@ -0,0 +1,130 @@
+# core/runtime.py
+#
+# Compact runtime state for the procedural engine. These classes are used in
+# the engine's hot paths instead of the pydantic models in models.py; they
+# refer back into the template tables by id instead of copying data, and are
+# converted to the validated models only at the API edge and when saving.
+
+from typing import Any, Dict, Optional, Tuple
+from .models import Item, GameState
+from .persistent import POrderedMap
+
+# Flavour suffixes that can be appended to a spawned item's description.
+ITEM_VARIANTS = ("unusually heavy", "slightly magical", "well-used", "brand new")
+
+class RuntimeItem:
+    __slots__ = ("item_id", "variant", "template")
+
+    def __init__(self, item_id: Optional[str], template: Dict[str, Any], variant: int = -1):
+        self.item_id = item_id
+        self.template = template
+        self.variant = variant
+
+    @property
+    def name(self) -> str:
+        return self.template["name"]
+
+    @property
+    def description(self) -> str:
+        desc = self.template["description"]
+        if self.variant >= 0:
+            desc += f" (It seems {ITEM_VARIANTS[self.variant]}.)"
+        return desc
+
+    @property
+    def properties(self) -> Dict[str, Any]:
+        return self.template["properties"]
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, RuntimeItem):
+            return NotImplemented
+        return (self.item_id, self.variant) == (other.item_id, other.variant) and (
+            self.item_id is not None or self.template == other.template)
+
+    def __hash__(self) -> int:
+        return hash((self.item_id, self.variant, self.name))
+
+    def to_model(self) -> Item:
+        return Item(name=self.name, description=self.description, properties=self.properties)
+
+    @classmethod
+    def from_model(cls, item: Item, item_ids_by_name: Dict[str, str], items: Dict[str, dict]) -> "RuntimeItem":
+        """Maps a saved Item back onto its template, keeping unknown items as standalone templates."""
+        item_id = item_ids_by_name.get(item.name)
+        if item_id is not None:
+            template = items[item_id]
+            for variant in range(-1, len(ITEM_VARIANTS)):
+                candidate = cls(item_id, template, variant)
+                if candidate.description == item.description:
+                    return candidate
+        return cls(None, {"name": item.name, "description": item.description, "properties": item.properties})
+
+class RuntimeNpc:
+    __slots__ = ("npc_id", "template", "dialogue")
+
+    def __init__(self, npc_id: str, template: Dict[str, Any], dialogue: Dict[str, str]):
+        self.npc_id = npc_id
+        self.template = template
+        self.dialogue = dialogue
+
+    @property
+    def name(self) -> str:
+        return self.template["name"]
+
+class RuntimeState:
+    """Mutable counterpart of models.GameState with the same attribute names.
+
+    The inventory and flags are immutable values that are replaced on every
+    change, so a snapshot can keep them by reference.
+    """
+
+    __slots__ = ("location", "inventory", "flags", "current_conversation", "player_name", "player_class")
+
+    def __init__(self, location: str):
+        self.location = location
+        self.inventory: POrderedMap = POrderedMap()
+        self.flags: Tuple[str, ...] = ()
+        self.current_conversation: Optional[str] = None
+        self.player_name: Optional[str] = None
+        self.player_class: Optional[str] = None
+
+    def to_model(self) -> GameState:
+        return GameState(
+            location=self.location,
+            inventory={k: v.to_model() for k, v in self.inventory.items()},
+            flags=list(self.flags),
+            current_conversation=self.current_conversation or None,
+            player_name=self.player_name,
+            player_class=self.player_class
+        )
+
+class RuntimeSnapshot:
+    """Point-in-time state of a procedural run.
+
+    Every part of the run that can change is immutable and replaced rather
+    than updated, so a snapshot only holds references: its cost does not
+    depend on the size of the inventory, the quest log or the world.
+    """
+
+    __slots__ = ("run", "state", "inventory", "flags", "visited", "history", "removed", "moves", "quests", "encoded")
+
+    def __init__(self, run, state: RuntimeState):
+        self.run = run
+        self.state = (state.location, state.current_conversation, state.player_name, state.player_class)
+        self.inventory = state.inventory
+        self.flags = state.flags
+        self.visited = run.visited_scenes
+        self.history = run.location_history
+        self.removed = run.removed_items
+        self.moves = run.moves
+        self.quests = run.quests.snapshot()
+        # (base, delta) of the last time this snapshot was saved against base
+        self.encoded = None
+
+    def replace(self, **changes) -> "RuntimeSnapshot":
+        """Returns a copy of this snapshot with some fields replaced."""
+        snapshot = RuntimeSnapshot.__new__(RuntimeSnapshot)
+        for name in self.__slots__:
+            setattr(snapshot, name, changes.get(name, getattr(self, name)))
+        snapshot.encoded = None
+        return snapshot
@@ -0,0 +1,331 @@
+# core/sessionStore.py
+
+import json
+import sqlite3
+from abc import ABC, abstractmethod
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+from .proceduralEngine import ProceduralStoryEngine
+from .contentRegistry import ContentRegistry
+from .templateReload import TemplateVersionUnavailable
+
+class VersionConflict(Exception):
+    """Raised when a session was written by someone else since it was read."""
+
+def serialize_state(state: dict) -> bytes:
+    return json.dumps(state, separators=(",", ":")).encode("utf-8")
+
+def deserialize_state(data: bytes) -> dict:
+    return json.loads(data.decode("utf-8")) if data else {}
+
+class SessionStore(ABC):
+    """Versioned blob storage for session state.
+
+    Every successful put() bumps the version by one. A put() whose
+    expected_version does not match the stored version raises VersionConflict.
+    Version 0 means "no such session".
+    """
+
+    @abstractmethod
+    def version(self, session_id: str) -> int:
+        """Returns the stored version of a session, 0 if there is none."""
+
+    @abstractmethod
+    def get(self, session_id: str) -> Tuple[int, Optional[bytes]]:
+        """Returns (version, data) of a session, (0, None) if there is none."""
+
+    @abstractmethod
+    def put(self, session_id: str, data: bytes, expected_version: int) -> int:
+        """Writes a session if it is still at expected_version and returns the new version."""
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        """Removes a session; unknown ids are ignored."""
+
+class MemorySessionStore(SessionStore):
+    """Process-local store. Only correct with a single worker."""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[int, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def version(self, session_id: str) -> int:
+        return self._data.get(session_id, (0, None))[0]
+
+    def get(self, session_id: str) -> Tuple[int, Optional[bytes]]:
+        return self._data.get(session_id, (0, None))
+
+    def put(self, session_id: str, data: bytes, expected_version: int) -> int:
+        with self._lock:
+            current = self.version(session_id)
+            if current != expected_version:
+                raise VersionConflict(f"Session '{session_id}' is at version {current}, expected {expected_version}")
+            self._data[session_id] = (current + 1, data)
+            return current + 1
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._data.pop(session_id, None)
+
+class SqliteSessionStore(SessionStore):
+    """Store backed by a SQLite file that can be shared by workers on one host."""
+
+    def __init__(self, path: str = "sessions.db"):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "id TEXT PRIMARY KEY, version INTEGER NOT NULL, data BLOB NOT NULL)"
+        )
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            self._local.conn = conn
+        return conn
+
+    def version(self, session_id: str) -> int:
+        row = self._conn().execute("SELECT version FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return row[0] if row else 0
+
+    def get(self, session_id: str) -> Tuple[int, Optional[bytes]]:
+        row = self._conn().execute("SELECT version, data FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return (row[0], bytes(row[1])) if row else (0, None)
+
+    def put(self, session_id: str, data: bytes, expected_version: int) -> int:
+        conn = self._conn()
+        with conn:
+            if expected_version == 0:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO sessions (id, version, data) VALUES (?, 1, ?)",
+                    (session_id, data)
+                )
+            else:
+                cursor = conn.execute(
+                    "UPDATE sessions SET version = version + 1, data = ? WHERE id = ? AND version = ?",
+                    (data, session_id, expected_version)
+                )
+        if cursor.rowcount != 1:
+            raise VersionConflict(f"Session '{session_id}' changed since version {expected_version}")
+        return expected_version + 1
+
+    def delete(self, session_id: str):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+class RedisSessionStore(SessionStore):
+    """Store for any server speaking the Redis protocol.
+
+    Each session is a hash with 'v' (version) and 'd' (data) fields. Writes
+    use WATCH/MULTI/EXEC, so a concurrent writer aborts the transaction.
+    Pass `client` to use an existing redis-py compatible client (for example
+    a local stand-in server during development).
+    """
+
+    def __init__(self, url: str = "redis://localhost:6379/0", client=None, prefix: str = "session:"):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, session_id: str) -> str:
+        return self.prefix + session_id
+
+    def version(self, session_id: str) -> int:
+        value = self.client.hget(self._key(session_id), "v")
+        return int(value) if value is not None else 0
+
+    def get(self, session_id: str) -> Tuple[int, Optional[bytes]]:
+        version, data = self.client.hmget(self._key(session_id), ["v", "d"])
+        if version is None:
+            return 0, None
+        return int(version), data
+
+    def put(self, session_id: str, data: bytes, expected_version: int) -> int:
+        from redis.exceptions import WatchError
+        key = self._key(session_id)
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                current = pipe.hget(key, "v")
+                current = int(current) if current is not None else 0
+                if current != expected_version:
+                    raise VersionConflict(f"Session '{session_id}' is at version {current}, expected {expected_version}")
+                pipe.multi()
+                pipe.hset(key, mapping={"v": current + 1, "d": data})
+                pipe.execute()
+            except WatchError:
+                raise VersionConflict(f"Session '{session_id}' was modified concurrently")
+        return expected_version + 1
+
+    def delete(self, session_id: str):
+        self.client.delete(self._key(session_id))
+
+def create_session_store(url: str) -> SessionStore:
+    """Builds a store from a URL: 'memory', 'sqlite:///path.db' or 'redis://host:port/db'.
+
+    'fakeredis://' runs the Redis store against an in-process fakeredis
+    server, for trying the Redis code path without a server; fakeredis is
+    a development dependency (requirements-dev.txt).
+    """
+    if not url or url == "memory":
+        return MemorySessionStore()
+    if url.startswith("sqlite:///"):
+        return SqliteSessionStore(url[len("sqlite:///"):])
+    if url.startswith("redis://") or url.startswith("rediss://"):
+        return RedisSessionStore(url)
+    if url.startswith("fakeredis://"):
+        try:
+            import fakeredis
+        except ImportError:
+            raise ImportError("fakeredis:// needs the fakeredis package from requirements-dev.txt") from None
+        return RedisSessionStore(client=fakeredis.FakeRedis())
+    raise ValueError(f"Unknown session store URL: {url}")
+
+class SessionManager:
+    """Loads engines for sessions from a SessionStore, with a per-worker read-through cache.
+
+    A cached engine is reused as long as the stored version still matches the
+    version it was built from, so the world is only regenerated from the seed
+    when another worker has written the session in between.
+
+    Runs stay on the content set and templates version they started with.
+    Every cached engine holds a reference on both in the ContentRegistry,
+    which keeps them loaded until no cached run uses them. Runs loaded later
+    get their version back from the registry's archive.
+    """
+
+    def __init__(self, store: SessionStore, content: ContentRegistry, cache_size: int = 256,
+                 recover: Optional[Callable[[str], Optional[Dict[str, Any]]]] = None):
+        self.store = store
+        self.content = content
+        # Returns save data (as written by run_save_data()) for sessions the store does not know
+        self.recover = recover
+        self.cache_size = cache_size
+        self._cache: Dict[str, Tuple[int, ProceduralStoryEngine]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.recovered = 0
+
+    def _new_engine(self, content_id: Optional[str] = None, template_version: Optional[str] = None) -> ProceduralStoryEngine:
+        """Builds an engine on a templates version, the current one by default.
+
+        Raises TemplateVersionUnavailable when the version is neither loaded
+        nor archived: the run is not moved onto other templates silently.
+        """
+        templates = self.content.get(content_id)
+        if template_version:
+            entry = templates.get(template_version)
+            if entry is None:
+                raise TemplateVersionUnavailable(
+                    f"Templates version {template_version} of content '{self.content.resolve(content_id)}' is not available")
+        else:
+            entry = templates.current
+        engine = ProceduralStoryEngine(templates=entry.templates)
+        engine.template_version = entry.version
+        engine.content_id = content_id
+        return engine
+
+    def load(self, session_id: str) -> Tuple[int, ProceduralStoryEngine]:
+        """Returns (version, engine) for the session. Unknown sessions get a fresh engine at version 0."""
+        version = self.store.version(session_id)
+        with self._lock:
+            cached = self._cache.get(session_id)
+        if cached and cached[0] == version:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        version, data = self.store.get(session_id)
+        if version == 0 and self.recover is not None:
+            recovered = self._recover(session_id)
+            if recovered is not None:
+                return recovered
+            version, data = self.store.get(session_id)
+        state = deserialize_state(data)
+        engine = self._new_engine(state.get("content_id"), state.get("templates_version"))
+        engine.import_state(state)
+        self._remember(session_id, version, engine)
+        return version, engine
+
+    def _recover(self, session_id: str) -> Optional[Tuple[int, ProceduralStoryEngine]]:
+        """Rebuilds an unknown session from recover() and writes it to the store."""
+        save_data = self.recover(session_id)
+        if not save_data:
+            return None
+        engine = self._new_engine(save_data.get("content_id"), save_data.get("templates_version"))
+        try:
+            engine.load_save_data(save_data)
+        except Exception as e:
+            print(f"Could not recover session '{session_id}': {e}")
+            return None
+        try:
+            version = self.save(session_id, engine, 0)
+        except VersionConflict:
+            # Another worker wrote the session meanwhile; use that instead.
+            return None
+        print(f"Session '{session_id}' recovered from its autosave")
+        self.recovered += 1
+        return version, engine
+
+    def fresh(self, session_id: str, content_id: Optional[str] = None) -> Tuple[int, ProceduralStoryEngine]:
+        """Returns (version, engine) with an engine on the current templates of a content set, for starting a new run.
+
+        Raises KeyError for unknown content ids.
+        """
+        return self.store.version(session_id), self._new_engine(content_id)
+
+    def save(self, session_id: str, engine: ProceduralStoryEngine, expected_version: int) -> int:
+        """Writes the engine state back. Raises VersionConflict if the session moved on."""
+        state = engine.export_state()
+        if state:
+            state["templates_version"] = engine.template_version
+            if engine.content_id:
+                state["content_id"] = engine.content_id
+        try:
+            version = self.store.put(session_id, serialize_state(state), expected_version)
+        except VersionConflict:
+            # The cached engine holds changes that were rejected; drop it so
+            # the next load rebuilds from the winning write.
+            with self._lock:
+                dropped = self._cache.pop(session_id, None)
+            if dropped:
+                self.content.release(dropped[1].content_id, dropped[1].template_version)
+            raise
+        self._remember(session_id, version, engine)
+        return version
+
+    def _remember(self, session_id: str, version: int, engine: ProceduralStoryEngine):
+        released = []
+        pinned = False
+        while True:
+            with self._lock:
+                previous = self._cache.get(session_id)
+                cached = previous is not None and previous[1] is engine
+                if cached or pinned:
+                    self._cache.pop(session_id, None)
+                    if previous is not None and not cached:
+                        released.append(previous[1])
+                    elif cached and pinned:
+                        # The engine was cached again meanwhile and already holds a pin.
+                        released.append(engine)
+                    if len(self._cache) >= self.cache_size:
+                        released.append(self._cache.pop(next(iter(self._cache)))[1])
+                    self._cache[session_id] = (version, engine)
+                    break
+            # Pin the engine's content outside the lock: acquiring may load
+            # the content set from disk, which must not hold up other sessions.
+            self.content.acquire(engine.content_id, engine.template_version)
+            pinned = True
+        for old in released:
+            self.content.release(old.content_id, old.template_version)
+
+    def stats(self) -> Dict[str, int]:
+        return {"cached_sessions": len(self._cache), "cache_hits": self.hits, "cache_misses": self.misses,
+                "recovered_sessions": self.recovered}
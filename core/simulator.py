@@ -0,0 +1,232 @@
+# core/simulator.py
+#
+# Headless player simulation. Agents pick commands from the choices of the
+# current scene using a policy, either against a ProceduralStoryEngine directly
+# or against the FastAPI app in-process, and are spread over a process pool.
+
+import hashlib
+import random
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+from .proceduralEngine import ProceduralStoryEngine
+
+END_CONVERSATION = "bye"
+
+class RandomPolicy:
+    """Picks uniformly among the available choices."""
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+
+    def choose(self, scene: Dict[str, Any]) -> str:
+        if scene.get("current_conversation"):
+            return END_CONVERSATION
+        choices = scene.get("choices", [])
+        return self.rng.choice(choices) if choices else "inventory"
+
+class ExplorerPolicy(RandomPolicy):
+    """Takes every item, talks to everyone once and prefers unvisited exits."""
+
+    def __init__(self, rng: random.Random):
+        super().__init__(rng)
+        self.seen_exits = set()
+        self.talked = set()
+
+    def choose(self, scene: Dict[str, Any]) -> str:
+        if scene.get("current_conversation"):
+            return END_CONVERSATION
+        choices = scene.get("choices", [])
+        for choice in choices:
+            if choice.startswith("take "):
+                return choice
+        for choice in choices:
+            if choice.startswith("talk to ") and (scene["scene_id"], choice) not in self.talked:
+                self.talked.add((scene["scene_id"], choice))
+                return choice
+        exits = [c for c in choices if c.startswith("go ")]
+        fresh = [c for c in exits if (scene["scene_id"], c) not in self.seen_exits]
+        pick = self.rng.choice(fresh or exits) if exits else "inventory"
+        self.seen_exits.add((scene["scene_id"], pick))
+        return pick
+
+class ScriptedPolicy:
+    """Replays a fixed list of commands in a loop."""
+
+    def __init__(self, commands: List[str]):
+        self.commands = commands
+        self.index = 0
+
+    def choose(self, scene: Dict[str, Any]) -> str:
+        command = self.commands[self.index % len(self.commands)]
+        self.index += 1
+        return command
+
+def make_policy(name: str, rng: random.Random, script: Optional[List[str]] = None):
+    if name == "random":
+        return RandomPolicy(rng)
+    if name == "explorer":
+        return ExplorerPolicy(rng)
+    if name == "scripted":
+        if not script:
+            raise ValueError("The scripted policy needs a list of commands")
+        return ScriptedPolicy(script)
+    raise ValueError(f"Unknown policy: {name}")
+
+class EngineDriver:
+    """Plays directly against an engine."""
+
+    def __init__(self, templates: dict):
+        self.engine = ProceduralStoryEngine(templates=templates)
+
+    def start(self, seed: str, world_size: Optional[int]):
+        self.engine.start_new_run(seed, world_size=world_size)
+
+    def scene(self) -> Dict[str, Any]:
+        return self.engine.get_current_scene_data()
+
+    def command(self, command: str) -> str:
+        return self.engine.process_command(command)
+
+    def inventory_size(self) -> int:
+        return len(self.engine.game_state.inventory)
+
+class ApiDriver:
+    """Plays through the FastAPI app in-process, one session per agent."""
+
+    def __init__(self, session_id: str):
+        from fastapi.testclient import TestClient
+        import api
+        self.client = TestClient(api.app)
+        self.headers = {"X-Session-Id": session_id}
+
+    def start(self, seed: str, world_size: Optional[int]):
+        self.client.post("/start_new_run", json={"seed": seed, "world_size": world_size}, headers=self.headers)
+
+    def scene(self) -> Dict[str, Any]:
+        return self.client.get("/scene", headers=self.headers).json()
+
+    def command(self, command: str) -> str:
+        while True:
+            response = self.client.post("/command", json={"command": command}, headers=self.headers)
+            if response.status_code != 429:
+                return response.json().get("result", "")
+            time.sleep(float(response.headers.get("Retry-After", "1")))
+
+    def inventory_size(self) -> int:
+        return len(self.scene().get("inventory", []))
+
+_templates: Optional[dict] = None
+
+def _init_worker(templates: dict):
+    global _templates
+    _templates = templates
+
+def play(driver, seed: str, agent: int, policy: str, steps: int, world_size: Optional[int],
+         script: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Plays one agent and returns its statistics and a hash of everything it saw."""
+    rng = random.Random(f"{seed}:{agent}")
+    chooser = make_policy(policy, rng, script)
+    trace = hashlib.sha1()
+    visited = set()
+    talks = 0
+    driver.start(seed, world_size)
+    start = time.perf_counter()
+    for _ in range(steps):
+        scene = driver.scene()
+        visited.add(scene.get("scene_id"))
+        command = chooser.choose(scene)
+        if command.startswith("talk to "):
+            talks += 1
+        result = driver.command(command)
+        trace.update(f"{scene.get('scene_id')}|{command}|{result}\n".encode("utf-8"))
+    elapsed = time.perf_counter() - start
+    return {
+        "seed": seed,
+        "agent": agent,
+        "commands": steps,
+        "seconds": elapsed,
+        "visited": len(visited),
+        "items": driver.inventory_size(),
+        "talks": talks,
+        "trace": trace.hexdigest()
+    }
+
+def run_agent(seed: str, agent: int, policy: str, steps: int, world_size: Optional[int],
+              use_api: bool = False, script: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Plays an agent, then replays it under tracemalloc to measure memory and check determinism."""
+    def driver():
+        return ApiDriver(f"sim-{seed}-{agent}") if use_api else EngineDriver(_templates)
+
+    result = play(driver(), seed, agent, policy, steps, world_size, script)
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    replay_driver = driver()
+    replay = play(replay_driver, seed, agent, policy, steps, world_size, script)
+    result["memory_bytes"] = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    del replay_driver
+
+    result["deterministic"] = replay["trace"] == result["trace"]
+    return result
+
+def simulate(templates: dict, agents: int, seeds: List[str], policy: str = "random", steps: int = 200,
+             processes: int = 1, world_size: Optional[int] = None, use_api: bool = False,
+             script: Optional[List[str]] = None, replicas: int = 1) -> Dict[str, Any]:
+    """Runs `agents` agents over the given seeds on a process pool and aggregates the results.
+
+    With replicas > 1 every agent is also played that many times in
+    independently scheduled jobs, so replays are compared across processes
+    as well as within one.
+    """
+    jobs = [(seeds[i % len(seeds)], i // len(seeds)) for i in range(agents)] * replicas
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(templates,)) as pool:
+        futures = [
+            pool.submit(run_agent, seed, agent, policy, steps, world_size, use_api, script)
+            for seed, agent in jobs
+        ]
+        results = [f.result() for f in futures]
+    wall = time.perf_counter() - start
+    return summarize(results, wall, processes)
+
+def summarize(results: List[Dict[str, Any]], wall: float, processes: int) -> Dict[str, Any]:
+    commands = sum(r["commands"] for r in results)
+    busy = sum(r["seconds"] for r in results)
+    # Replicas of an agent (same seed, agent index and policy) must see the same game.
+    traces: Dict[tuple, set] = {}
+    for r in results:
+        traces.setdefault((r["seed"], r["agent"]), set()).add(r["trace"])
+    nondeterministic = sorted(
+        {f"{r['seed']}#{r['agent']}" for r in results if not r["deterministic"]} |
+        {f"{seed}#{agent}" for (seed, agent), hashes in traces.items() if len(hashes) > 1}
+    )
+    per_seed: Dict[str, List[Dict[str, Any]]] = {}
+    for r in results:
+        per_seed.setdefault(r["seed"], []).append(r)
+
+    def spread(values: List[float]) -> Dict[str, float]:
+        return {"min": min(values), "mean": sum(values) / len(values), "max": max(values)}
+
+    return {
+        "agents": len(results),
+        "processes": processes,
+        "commands": commands,
+        "wall_seconds": wall,
+        "commands_per_second": commands / wall if wall else 0.0,
+        "commands_per_second_per_core": commands / busy if busy else 0.0,
+        "memory_per_agent_bytes": spread([r["memory_bytes"] for r in results]),
+        "visited": spread([r["visited"] for r in results]),
+        "items": spread([r["items"] for r in results]),
+        "talks": spread([r["talks"] for r in results]),
+        "per_seed": {
+            seed: {
+                "visited": spread([r["visited"] for r in rs]),
+                "items": spread([r["items"] for r in rs])
+            }
+            for seed, rs in per_seed.items()
+        },
+        "nondeterministic": nondeterministic
+    }
@@ -0,0 +1,180 @@
+# core/suggestions.py
+#
+# Next-move suggestions from a Markov index over gameplay. For every choice a
+# player picks, the counts of that choice are bumped under the current
+# location alone and under the current location plus the locations visited
+# before it. Suggesting looks up the longest context that has been seen and
+# ranks the choices the scene offers right now, backing off to shorter
+# contexts for choices the longer one has no data on.
+#
+# Several workers can share one index file. Each keeps the counts it added
+# since its last save, and save() adds them to what is on disk under a file
+# lock, then picks up everything the other workers have saved.
+
+import heapq
+import json
+import os
+import re
+import threading
+from typing import Any, Dict, List, Sequence
+from .fileio import write_atomic
+from .worldSynth import location_template_id
+
+try:
+    import fcntl
+except ImportError:  # Windows: saves from several workers are not serialized.
+    fcntl = None
+
+# Weight kept by each step back to a shorter context ("stupid backoff").
+BACKOFF = 0.4
+
+def normalize_choice(choice: str) -> str:
+    """Drops the destination name from "go north (Dark Cave)" so moves generalize across worlds."""
+    return re.sub(r"\s*\(.*\)$", "", choice.strip().lower())
+
+def _add_counts(contexts: Dict[str, Dict[str, int]], added: Dict[str, Dict[str, int]]):
+    for key, counts in added.items():
+        target = contexts.setdefault(key, {})
+        for choice, count in counts.items():
+            target[choice] = target.get(choice, 0) + count
+
+class SuggestionIndex:
+    """Counts of choices by context, with rare contexts pruned to keep memory bounded."""
+
+    def __init__(self, order: int = 3, max_contexts: int = 50000, max_choices: int = 32):
+        self.order = order
+        self.max_contexts = max_contexts
+        self.max_choices = max_choices
+        # context key -> [total, {choice: count}]
+        self._contexts: Dict[str, List[Any]] = {}
+        # context key -> {choice: count} added since the last save
+        self._unsaved: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self.updates = 0
+        self.pruned = 0
+
+    def contexts(self, history: Sequence[str]) -> List[str]:
+        """Context keys for a location history ending at the current location, longest first."""
+        places = [location_template_id(loc) for loc in history[-self.order:]]
+        return ["|".join(places[i:]) for i in range(len(places))]
+
+    def observe(self, history: Sequence[str], choice: str):
+        """Records that `choice` was picked after `history` (oldest first, current location last)."""
+        if not history:
+            return
+        choice = normalize_choice(choice)
+        with self._lock:
+            self.updates += 1
+            for key in self.contexts(history):
+                entry = self._contexts.get(key)
+                if entry is None:
+                    entry = self._contexts[key] = [0, {}]
+                counts = entry[1]
+                if choice not in counts and len(counts) >= self.max_choices:
+                    # Make room by forgetting the least picked choice of this context.
+                    rarest = min(counts, key=counts.get)
+                    entry[0] -= counts.pop(rarest)
+                counts[choice] = counts.get(choice, 0) + 1
+                entry[0] += 1
+                unsaved = self._unsaved.setdefault(key, {})
+                unsaved[choice] = unsaved.get(choice, 0) + 1
+            if len(self._contexts) > self.max_contexts:
+                self._prune()
+
+    def _prune(self):
+        """Drops the least seen contexts until the index is back to three quarters of its limit."""
+        drop = len(self._contexts) - self.max_contexts * 3 // 4
+        for key, _ in heapq.nsmallest(drop, self._contexts.items(), key=lambda item: item[1][0]):
+            del self._contexts[key]
+            self._unsaved.pop(key, None)
+        self.pruned += drop
+
+    def suggest(self, history: Sequence[str], choices: Sequence[str], k: int = 3) -> List[Dict[str, Any]]:
+        """Ranks the available choices for a location history; returns up to k with their scores."""
+        if not history or not choices:
+            return []
+        scores: Dict[str, float] = {}
+        weight = 1.0
+        with self._lock:
+            for key in self.contexts(history):
+                entry = self._contexts.get(key)
+                if entry is not None and entry[0]:
+                    total, counts = entry
+                    for choice in choices:
+                        if choice not in scores:
+                            count = counts.get(normalize_choice(choice))
+                            if count:
+                                scores[choice] = weight * count / total
+                weight *= BACKOFF
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [{"choice": choice, "score": round(score, 4)} for choice, score in ranked]
+
+    def export(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"order": self.order, "contexts": {key: entry[1] for key, entry in self._contexts.items()}}
+
+    def _limit_choices(self, counts: Dict[str, int]) -> Dict[str, int]:
+        if len(counts) <= self.max_choices:
+            return dict(counts)
+        return dict(heapq.nlargest(self.max_choices, counts.items(), key=lambda item: item[1]))
+
+    def _bounded(self, contexts: Dict[str, Dict[str, int]]) -> Dict[str, Dict[str, int]]:
+        """Copies saved counts within the context and choice limits, so the shared file stays bounded too."""
+        contexts = {key: self._limit_choices(counts) for key, counts in contexts.items() if key.count("|") < self.order}
+        if len(contexts) > self.max_contexts:
+            keep = self.max_contexts * 3 // 4
+            contexts = dict(heapq.nlargest(keep, contexts.items(), key=lambda item: sum(item[1].values())))
+        return contexts
+
+    def restore(self, data: Dict[str, Any]):
+        """Replaces the counts with saved ones, keeping anything observed since the last save on top."""
+        contexts = {key: [sum(counts.values()), counts] for key, counts in self._bounded(data.get("contexts", {})).items()}
+        with self._lock:
+            for key, counts in self._unsaved.items():
+                entry = contexts.setdefault(key, [0, {}])
+                for choice, count in counts.items():
+                    entry[1][choice] = entry[1].get(choice, 0) + count
+                    entry[0] += count
+            self._contexts = contexts
+            if len(self._contexts) > self.max_contexts:
+                self._prune()
+
+    @staticmethod
+    def _read(path: str) -> Dict[str, Any]:
+        if not os.path.exists(path):
+            return {}
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def save(self, path: str):
+        """Adds the counts observed since the last save to the file, then reloads the merged result.
+
+        The file is locked meanwhile, so workers sharing it do not overwrite
+        each other's counts.
+        """
+        with self._save_lock, open(path + ".lock", 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            with self._lock:
+                unsaved, self._unsaved = self._unsaved, {}
+            try:
+                contexts = self._read(path).get("contexts", {})
+                _add_counts(contexts, unsaved)
+                contexts = self._bounded(contexts)
+                write_atomic(path, json.dumps({"order": self.order, "contexts": contexts}, separators=(",", ":")))
+            except BaseException:
+                with self._lock:
+                    _add_counts(self._unsaved, unsaved)
+                raise
+            self.restore({"contexts": contexts})
+
+    def load(self, path: str) -> bool:
+        """Loads a saved index if the file exists. Returns True when one was loaded."""
+        if not os.path.exists(path):
+            return False
+        self.restore(self._read(path))
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {"contexts": len(self._contexts), "updates": self.updates, "pruned_contexts": self.pruned}
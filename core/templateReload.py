@@ -0,0 +1,271 @@
+# core/templateReload.py
+#
+# Hot reloading of the templates file. A background thread polls the file,
+# and when it changes the new content is parsed, validated and compiled off
+# the request path, then swapped in as the current version. Runs keep using
+# the version they started with: each live engine holds a reference on its
+# version, and old versions are dropped from memory once nothing refers to
+# them. With an archive directory, every version is also kept on disk by its
+# content hash, so a stored run whose version was dropped (its engine left
+# the cache, the process restarted, or another worker loaded it) gets its
+# templates back instead of being moved onto the current ones.
+
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+from . import encounters, quests
+from .fileio import write_atomic
+
+class TemplateError(ValueError):
+    """Raised when a templates file fails validation."""
+
+class TemplateVersionUnavailable(LookupError):
+    """Raised when a run needs a templates version that is neither loaded nor archived."""
+
+def validate_templates(templates: dict):
+    """Checks the structure the engines rely on and raises TemplateError on the first problem."""
+    for section in ("locations", "items", "npcs", "game_settings"):
+        if not isinstance(templates.get(section), dict):
+            raise TemplateError(f"Missing or invalid '{section}' section")
+    locations = templates["locations"]
+    start = templates["game_settings"].get("starting_location")
+    if start not in locations:
+        raise TemplateError(f"Starting location '{start}' is not defined")
+    for loc_id, loc in locations.items():
+        for field in ("name", "description"):
+            if field not in loc:
+                raise TemplateError(f"Location '{loc_id}' has no '{field}'")
+        for direction, target in loc.get("connections", {}).items():
+            if target not in locations:
+                raise TemplateError(f"Location '{loc_id}' connects {direction} to unknown location '{target}'")
+    for item_id, item in templates["items"].items():
+        for field in ("name", "description", "properties"):
+            if field not in item:
+                raise TemplateError(f"Item '{item_id}' has no '{field}'")
+    for npc_id, npc in templates["npcs"].items():
+        if "name" not in npc:
+            raise TemplateError(f"NPC '{npc_id}' has no 'name'")
+
+def compile_templates(templates: dict):
+    """Builds the derived tables up front so the first request on a new version does not pay for them."""
+    encounters.encounter_table(templates)
+    quests.quest_book(templates)
+
+def parse_templates(raw: bytes) -> dict:
+    """Parses a templates file, validates it and compiles its derived tables."""
+    templates = json.loads(raw)
+    validate_templates(templates)
+    compile_templates(templates)
+    return templates
+
+def forget_compiled(templates: dict):
+    encounters.forget_compiled(templates)
+    quests.forget_compiled(templates)
+
+def deep_size(obj) -> int:
+    """Approximate bytes held by a tree of JSON values, counting shared objects once."""
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, list):
+            stack.extend(obj)
+        elif hasattr(obj, "__dict__"):
+            # Parsed models, such as a StoryData
+            stack.extend(vars(obj).values())
+    return total
+
+class TemplateVersion:
+    __slots__ = ("version", "templates", "loaded_at", "refcount", "memory_bytes")
+
+    def __init__(self, version: str, templates: dict):
+        self.version = version
+        self.templates = templates
+        self.loaded_at = time.time()
+        self.refcount = 0
+        self.memory_bytes = deep_size(templates)
+
+class TemplateReloader:
+    """Serves the current templates and keeps older versions alive while runs use them.
+
+    Versions are named by a hash of the file content, so every worker that
+    reads the same file agrees on the version names. `parse` turns the file
+    content into what a version serves; story files pass their own.
+    """
+
+    def __init__(self, path: str, interval: float = 1.0, archive: Optional[str] = None,
+                 parse: Callable[[bytes], Any] = parse_templates):
+        self.path = path
+        self.interval = interval
+        self.archive = archive
+        self.parse = parse
+        self._lock = threading.Lock()
+        self._versions: Dict[str, TemplateVersion] = {}
+        self._listeners: List[Callable[[TemplateVersion], None]] = []
+        self._stamp = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.reloads = 0
+        self.failed_reloads = 0
+        self.last_reload_seconds: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.current = self._load()
+        self._versions[self.current.version] = self.current
+
+    def _file_stamp(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self) -> TemplateVersion:
+        self._stamp = self._file_stamp()
+        with open(self.path, 'rb') as f:
+            raw = f.read()
+        version = TemplateVersion(hashlib.sha1(raw).hexdigest()[:12], self.parse(raw))
+        self._archive(version.version, raw)
+        return version
+
+    def _archive_path(self, version: str) -> Optional[str]:
+        if self.archive is None or not re.fullmatch(r"[0-9a-f]{12}", version):
+            return None
+        return os.path.join(self.archive, f"{version}.json")
+
+    def _archive(self, version: str, raw: bytes):
+        path = self._archive_path(version)
+        if path is None or os.path.exists(path):
+            return
+        try:
+            os.makedirs(self.archive, exist_ok=True)
+            write_atomic(path, raw)
+        except OSError as e:
+            print(f"Could not archive templates version {version}: {e}")
+
+    def _load_archived(self, version: str) -> Optional[TemplateVersion]:
+        path = self._archive_path(version)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return None
+        if hashlib.sha1(raw).hexdigest()[:12] != version:
+            print(f"Archived templates {path} do not match version {version}")
+            return None
+        templates = self.parse(raw)
+        print(f"Templates version {version} restored from {path}")
+        return TemplateVersion(version, templates)
+
+    def on_swap(self, listener: Callable[[TemplateVersion], None]):
+        self._listeners.append(listener)
+
+    def check(self) -> bool:
+        """Reloads the file if it changed. Returns True when a new version was swapped in."""
+        try:
+            if self._file_stamp() == self._stamp:
+                return False
+            start = time.perf_counter()
+            loaded = self._load()
+        except Exception as e:
+            self.failed_reloads += 1
+            self.last_error = str(e)
+            print(f"Template reload of {self.path} failed, keeping version {self.current.version}: {e}")
+            return False
+        if loaded.version == self.current.version:
+            return False
+        with self._lock:
+            old = self.current
+            self._versions.setdefault(loaded.version, loaded)
+            self.current = self._versions[loaded.version]
+            dropped = old.refcount == 0 and old is not self.current
+            if dropped:
+                self._versions.pop(old.version, None)
+        if dropped:
+            forget_compiled(old.templates)
+        self.reloads += 1
+        self.last_reload_seconds = time.perf_counter() - start
+        self.last_error = None
+        print(f"Templates reloaded from {self.path}: version {self.current.version} in {self.last_reload_seconds * 1000:.1f} ms")
+        for listener in self._listeners:
+            listener(self.current)
+        return True
+
+    def get(self, version: Optional[str]) -> Optional[TemplateVersion]:
+        """Returns a version, reading it back from the archive if it was dropped; None if it is unknown."""
+        with self._lock:
+            entry = self._versions.get(version)
+        if entry is not None or not version:
+            return entry
+        loaded = self._load_archived(version)
+        if loaded is None:
+            return None
+        with self._lock:
+            return self._versions.setdefault(version, loaded)
+
+    def acquire(self, version: str):
+        with self._lock:
+            entry = self._versions.get(version)
+            if entry is not None:
+                entry.refcount += 1
+
+    def release(self, version: str):
+        with self._lock:
+            entry = self._versions.get(version)
+            if entry is None:
+                return
+            entry.refcount -= 1
+            dropped = entry.refcount <= 0 and entry is not self.current
+            if dropped:
+                del self._versions[version]
+        if dropped:
+            forget_compiled(entry.templates)
+
+    def retained(self) -> List[TemplateVersion]:
+        with self._lock:
+            return list(self._versions.values())
+
+    def memory_bytes(self) -> int:
+        return sum(v.memory_bytes for v in self.retained())
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name="template-reloader", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            pinned = {v.version: v.refcount for v in self._versions.values()}
+            memory = sum(v.memory_bytes for v in self._versions.values())
+        return {
+            "current_version": self.current.version,
+            "memory_bytes": memory,
+            "reloads": self.reloads,
+            "failed_reloads": self.failed_reloads,
+            "last_reload_seconds": self.last_reload_seconds,
+            "last_error": self.last_error,
+            "versions_retained": len(pinned),
+            "pinned_runs": pinned
+        }
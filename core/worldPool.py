@@ -0,0 +1,166 @@
+# core/worldPool.py
+
+import secrets
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+from .proceduralEngine import ProceduralStoryEngine
+
+_worker_engine: Optional[ProceduralStoryEngine] = None
+
+def _init_worker(templates: dict):
+    global _worker_engine
+    _worker_engine = ProceduralStoryEngine(templates=templates)
+
+def _build_blueprint(seed: str, world_size: Optional[int]) -> Dict[str, Any]:
+    _worker_engine.start_new_run(seed, world_size=world_size)
+    return _worker_engine.export_world()
+
+class WorldPool:
+    """Keeps pre-generated worlds ready so unseeded runs start without generating anything.
+
+    Worlds for fresh random seeds are built in a background process pool and
+    queued; acquire() pops one in O(1) and schedules a replacement. Runs with
+    an explicit seed are generated on demand in this process and kept in a
+    small LRU cache, since shared seeds tend to be requested repeatedly.
+    """
+
+    def __init__(self, templates: dict, depth: int = 4, world_size: Optional[int] = None,
+                 workers: int = 1, seed_cache_size: int = 32, template_version: Optional[str] = None):
+        self.templates = templates
+        self.template_version = template_version
+        self._generation = 0
+        self.depth = depth
+        self.world_size = world_size
+        self.workers = workers
+        self.seed_cache_size = seed_cache_size
+        self._ready = deque()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._builder = ProceduralStoryEngine(templates=templates)
+        self._builder.template_version = template_version
+        self._builder_lock = threading.Lock()
+        self._seed_cache: "OrderedDict[Tuple[str, Optional[int]], Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.seed_cache_hits = 0
+        self.seed_cache_misses = 0
+        self.refills = 0
+        self._refill_seconds = 0.0
+        self._started_at = time.monotonic()
+
+    def start(self):
+        if self.depth <= 0 or self._executor is not None:
+            return
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(self.templates,))
+        self._refill()
+
+    def reset(self, templates: dict, template_version: Optional[str] = None):
+        """Switches to new templates, dropping every world built from the old ones."""
+        with self._lock:
+            self.templates = templates
+            self.template_version = template_version
+            self._generation += 1
+            self._ready.clear()
+            self._seed_cache.clear()
+            self._pending = 0
+        builder = ProceduralStoryEngine(templates=templates)
+        builder.template_version = template_version
+        with self._builder_lock:
+            self._builder = builder
+        if self._executor is not None:
+            self.shutdown()
+            self.start()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _refill(self):
+        with self._lock:
+            if self._executor is None:
+                return
+            missing = self.depth - len(self._ready) - self._pending
+            self._pending += max(missing, 0)
+            generation = self._generation
+        for _ in range(missing):
+            submitted = time.monotonic()
+            future = self._executor.submit(_build_blueprint, secrets.token_hex(4), self.world_size)
+            future.add_done_callback(lambda f, submitted=submitted: self._on_built(f, submitted, generation))
+
+    def _on_built(self, future, submitted: float, generation: int):
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._pending -= 1
+            if future.cancelled() or future.exception() is not None:
+                if not future.cancelled():
+                    print(f"World pool refill failed: {future.exception()}")
+                return
+            blueprint = future.result()
+            blueprint["templates_version"] = self.template_version
+            self._ready.append(blueprint)
+            self.refills += 1
+            self._refill_seconds += time.monotonic() - submitted
+
+    def _build(self, seed: Optional[str], world_size: Optional[int]) -> Dict[str, Any]:
+        with self._builder_lock:
+            self._builder.start_new_run(seed, world_size=world_size)
+            blueprint = self._builder.export_world()
+            blueprint["templates_version"] = self._builder.template_version
+        return blueprint
+
+    def acquire(self, seed: Optional[str] = None, world_size: Optional[int] = None) -> Dict[str, Any]:
+        """Returns a world blueprint for ProceduralStoryEngine.start_from_blueprint()."""
+        if seed is None:
+            blueprint = None
+            if world_size == self.world_size:
+                with self._lock:
+                    blueprint = self._ready.popleft() if self._ready else None
+            if blueprint is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+                blueprint = self._build(None, world_size)
+            self._refill()
+            return blueprint
+
+        key = (seed, world_size)
+        with self._lock:
+            blueprint = self._seed_cache.get(key)
+            if blueprint is not None:
+                self._seed_cache.move_to_end(key)
+        if blueprint is not None:
+            self.seed_cache_hits += 1
+            return blueprint
+        self.seed_cache_misses += 1
+        blueprint = self._build(seed, world_size)
+        with self._lock:
+            if blueprint["templates_version"] != self.template_version:
+                return blueprint
+            self._seed_cache[key] = blueprint
+            if len(self._seed_cache) > self.seed_cache_size:
+                self._seed_cache.popitem(last=False)
+        return blueprint
+
+    def stats(self) -> Dict[str, Any]:
+        requests = self.hits + self.misses
+        uptime = time.monotonic() - self._started_at
+        return {
+            "depth": len(self._ready),
+            "target_depth": self.depth,
+            "pending_refills": self._pending,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests else None,
+            "refills": self.refills,
+            "refills_per_minute": self.refills * 60 / uptime if uptime else 0.0,
+            "avg_refill_seconds": self._refill_seconds / self.refills if self.refills else None,
+            "seed_cache_size": len(self._seed_cache),
+            "seed_cache_hits": self.seed_cache_hits,
+            "seed_cache_misses": self.seed_cache_misses
+        }
@@ -0,0 +1,205 @@
+# core/worldSynth.py
+#
+# Synthesizes large worlds from the location, item and NPC templates. The
+# world is a width x height grid of locations split into square regions.
+# Every region is derived only from (seed, region coordinates), so regions can
+# be produced independently and on demand, in any order, and regenerated
+# identically after being dropped from memory.
+
+import random
+from bisect import bisect
+from itertools import accumulate
+from typing import Any, Dict, Iterator, List, Tuple
+from .runtime import ITEM_VARIANTS, RuntimeItem, RuntimeNpc
+
+GREETING_SUFFIXES = (
+    "What brings you here?",
+    "You look like you have questions.",
+    "The forest is full of secrets.",
+    "Be wary of the shadows."
+)
+
+QUEST_SUFFIXES = (
+    "Will you accept this challenge?",
+    "It's not for the faint of heart.",
+    "Legends say only the brave succeed."
+)
+
+def spawn_item(item_id: str, item_data: dict, rng) -> RuntimeItem:
+    variant = -1
+    if rng.random() < 0.3:
+        variant = rng.randrange(len(ITEM_VARIANTS))
+    return RuntimeItem(item_id, item_data, variant)
+
+def spawn_npc(npc_id: str, npc_data: dict, rng) -> RuntimeNpc:
+    dialogue = dict(npc_data.get("dialogue", {}))
+    if "greeting" in dialogue:
+        dialogue["greeting"] += " " + rng.choice(GREETING_SUFFIXES)
+    if "quest" in dialogue and rng.random() < 0.5:
+        dialogue["quest"] += " " + rng.choice(QUEST_SUFFIXES)
+    return RuntimeNpc(npc_id, npc_data, dialogue)
+
+class SynthLocation:
+    __slots__ = ("loc_id", "template_id", "template", "x", "y")
+
+    def __init__(self, loc_id: str, template_id: str, template: dict, x: int, y: int):
+        self.loc_id = loc_id
+        self.template_id = template_id
+        self.template = template
+        self.x = x
+        self.y = y
+
+    @property
+    def name(self) -> str:
+        return self.template["name"]
+
+    @property
+    def description(self) -> str:
+        return self.template["description"]
+
+class RegionChunk:
+    """Everything generated for one region: locations, connections, items and NPCs."""
+
+    __slots__ = ("key", "locations", "connections", "items", "npcs")
+
+    def __init__(self, key: Tuple[int, int]):
+        self.key = key
+        self.locations: Dict[str, SynthLocation] = {}
+        self.connections: Dict[str, Dict[str, str]] = {}
+        self.items: Dict[str, List[RuntimeItem]] = {}
+        self.npcs: Dict[str, List[RuntimeNpc]] = {}
+
+def location_id(template_id: str, x: int, y: int) -> str:
+    return f"{template_id}@{x},{y}"
+
+def location_template_id(loc_id: str) -> str:
+    return loc_id.split("@", 1)[0]
+
+def location_coords(loc_id: str) -> Tuple[int, int]:
+    x, y = loc_id.rsplit("@", 1)[1].split(",")
+    return int(x), int(y)
+
+class WorldSynthesizer:
+    """Builds regions of a synthetic world for one seed.
+
+    Danger grows with distance from the starting cell in the middle of the
+    map; each cell picks a location template weighted towards the target
+    danger level. Template items spawn with a chance based on the location's
+    discovery_chance. East-west passages are always open, north-south ones
+    are open on the first column of each region and randomly elsewhere, so
+    the whole map stays connected.
+    """
+
+    def __init__(self, templates: dict, seed: str, width: int, height: int = None, region_size: int = 16):
+        self.templates = templates
+        self.seed = seed
+        self.width = width
+        self.height = height or width
+        if self.width < 1 or self.height < 1 or region_size < 1:
+            raise ValueError(f"Invalid world size {width}x{height} with regions of {region_size}")
+        self.region_size = region_size
+        self.start = (self.width // 2, self.height // 2)
+        self.starting_template = templates["game_settings"]["starting_location"]
+
+        locations = templates["locations"]
+        self.template_ids = list(locations.keys())
+        self.max_danger = max(loc.get("danger_level", 0) for loc in locations.values())
+        # One cumulative weight table per target danger level, built once.
+        self.danger_tables: List[List[float]] = []
+        for target in range(self.max_danger + 1):
+            weights = [1.0 / (1 + 2 * abs(locations[t].get("danger_level", 0) - target)) for t in self.template_ids]
+            self.danger_tables.append(list(accumulate(weights)))
+
+    @property
+    def location_count(self) -> int:
+        return self.width * self.height
+
+    def region_of(self, x: int, y: int) -> Tuple[int, int]:
+        return x // self.region_size, y // self.region_size
+
+    def start_location(self) -> str:
+        return location_id(self.starting_template, *self.start)
+
+    def _cell_header(self, x: int, y: int) -> Tuple[random.Random, str, bool]:
+        """Returns the cell's RNG, its template id and whether its south passage is open.
+
+        The first two draws of a cell's RNG fix its template and south
+        passage; neighbouring cells only ever need this header.
+        """
+        rng = random.Random(f"{self.seed}:{x}:{y}")
+        if (x, y) == self.start:
+            template_id = self.starting_template
+            rng.random()
+        else:
+            distance = abs(x - self.start[0]) + abs(y - self.start[1])
+            span = max(self.width, self.height)
+            target = min(self.max_danger, distance * (self.max_danger + 1) // span)
+            table = self.danger_tables[target]
+            template_id = self.template_ids[bisect(table, rng.random() * table[-1])]
+        south_open = x % self.region_size == 0 or rng.random() < 0.5
+        return rng, template_id, south_open
+
+    def iter_region(self, rx: int, ry: int) -> Iterator[Tuple[SynthLocation, Dict[str, str], List[RuntimeItem], List[RuntimeNpc]]]:
+        """Yields (location, connections, items, npcs) for each cell of a region."""
+        items = self.templates["items"]
+        npcs = self.templates["npcs"]
+        x0, y0 = rx * self.region_size, ry * self.region_size
+        x1, y1 = min(x0 + self.region_size, self.width), min(y0 + self.region_size, self.height)
+
+        # Headers for the region plus a one-cell border, so connections to
+        # neighbouring regions can be named without generating them.
+        headers = {}
+        for y in range(max(0, y0 - 1), min(self.height, y1 + 1)):
+            for x in range(max(0, x0 - 1), min(self.width, x1 + 1)):
+                if x0 <= x < x1 or y0 <= y < y1:
+                    headers[(x, y)] = self._cell_header(x, y)
+
+        for y in range(y0, y1):
+            for x in range(x0, x1):
+                rng, template_id, south_open = headers[(x, y)]
+                loc_data = self.templates["locations"][template_id]
+                location = SynthLocation(location_id(template_id, x, y), template_id, loc_data, x, y)
+
+                conns = {}
+                if y > 0 and headers[(x, y - 1)][2]:
+                    conns["north"] = location_id(headers[(x, y - 1)][1], x, y - 1)
+                if y + 1 < self.height and south_open:
+                    conns["south"] = location_id(headers[(x, y + 1)][1], x, y + 1)
+                if x + 1 < self.width:
+                    conns["east"] = location_id(headers[(x + 1, y)][1], x + 1, y)
+                if x > 0:
+                    conns["west"] = location_id(headers[(x - 1, y)][1], x - 1, y)
+
+                chance = 0.5 + loc_data.get("discovery_chance", 0) / 2
+                scene_items = [
+                    spawn_item(item_id, items[item_id], rng)
+                    for item_id in loc_data.get("items", [])
+                    if item_id in items and rng.random() < chance
+                ]
+                scene_npcs = [
+                    spawn_npc(npc_id, npcs[npc_id], rng)
+                    for npc_id in loc_data.get("npcs", [])
+                    if npc_id in npcs and rng.random() < 0.5
+                ]
+                yield location, conns, scene_items, scene_npcs
+
+    def generate_region(self, rx: int, ry: int) -> RegionChunk:
+        chunk = RegionChunk((rx, ry))
+        for location, conns, scene_items, scene_npcs in self.iter_region(rx, ry):
+            chunk.locations[location.loc_id] = location
+            chunk.connections[location.loc_id] = conns
+            chunk.items[location.loc_id] = scene_items
+            chunk.npcs[location.loc_id] = scene_npcs
+        return chunk
+
+    def regions_around(self, x: int, y: int, radius: int = 1) -> Iterator[Tuple[int, int]]:
+        """Yields the keys of the regions within `radius` of the region containing (x, y)."""
+        rx, ry = self.region_of(x, y)
+        max_rx = (self.width - 1) // self.region_size
+        max_ry = (self.height - 1) // self.region_size
+        for ny in range(max(0, ry - radius), min(max_ry, ry + radius) + 1):
+            for nx in range(max(0, rx - radius), min(max_rx, rx + radius) + 1):
+                yield nx, ny
+
+    def settings(self) -> List[Any]:
+        return [self.width, self.height, self.region_size]
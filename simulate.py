@@ -0,0 +1,39 @@
+import argparse
+import json
+import os
+from core.proceduralEngine import ProceduralStoryEngine
+from core.simulator import simulate
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run headless player simulations against the procedural engine.")
+    parser.add_argument("--templates", default="templates.json", help="Templates file to simulate.")
+    parser.add_argument("--agents", type=int, default=100, help="Number of simulated players.")
+    parser.add_argument("--seeds", nargs="+", default=["sim1", "sim2", "sim3", "sim4"], help="Seeds shared out over the agents.")
+    parser.add_argument("--policy", choices=["random", "explorer", "scripted"], default="random", help="How agents pick commands.")
+    parser.add_argument("--script", help="File with one command per line for the scripted policy.")
+    parser.add_argument("--steps", type=int, default=200, help="Commands per agent.")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="Worker processes.")
+    parser.add_argument("--world_size", type=int, default=None, help="Synthesize an N x N world instead of the template map.")
+    parser.add_argument("--replicas", type=int, default=1, help="Play every agent this many times to compare replays across processes.")
+    parser.add_argument("--api", action="store_true", help="Drive the FastAPI app in-process instead of the engine.")
+    parser.add_argument("--command_rate", type=float, default=1e6,
+                        help="Per-session and global command rate limit for --api runs. Throttled commands are retried.")
+    args = parser.parse_args()
+    if args.api:
+        os.environ["COMMAND_RATE"] = os.environ["GLOBAL_COMMAND_RATE"] = str(args.command_rate)
+
+    script = None
+    if args.script:
+        with open(args.script, 'r') as f:
+            script = [line.strip() for line in f if line.strip()]
+
+    templates = ProceduralStoryEngine(templates_file=args.templates).templates
+    report = simulate(
+        templates, args.agents, args.seeds, policy=args.policy, steps=args.steps,
+        processes=args.processes, world_size=args.world_size, use_api=args.api, script=script,
+        replicas=args.replicas
+    )
+    print(json.dumps(report, indent=2))
+    if report["nondeterministic"]:
+        print(f"WARNING: non-deterministic replays: {', '.join(report['nondeterministic'])}")
+        raise SystemExit(1)
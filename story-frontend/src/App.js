@@ -230,10 +230,33 @@ function getSceneBgClass(scene) {
   return '';
 }
 
+// Every browser plays its own session: a random id kept in localStorage and
+// sent as X-Session-Id on each request. Without it the API puts all players
+// in one shared "default" session.
+function getSessionId() {
+  const newId = () => (window.crypto && window.crypto.randomUUID)
+    ? window.crypto.randomUUID()
+    : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+  try {
+    let id = window.localStorage.getItem('sessionId');
+    if (!id) {
+      id = newId();
+      window.localStorage.setItem('sessionId', id);
+    }
+    return id;
+  } catch (e) {
+    // Storage is unavailable (e.g. blocked cookies): keep the id for this page only.
+    return newId();
+  }
+}
+
+const sessionId = getSessionId();
+axios.defaults.headers.common['X-Session-Id'] = sessionId;
+
 async function getIntent(command, backendURL) {
   const response = await fetch(`${backendURL}/intent`, {
     method: 'POST',
-    headers: { 'Content-Type': 'application/json' },
+    headers: { 'Content-Type': 'application/json', 'X-Session-Id': sessionId },
     body: JSON.stringify({ text: command })
   });
   const data = await response.json();
@@ -345,23 +368,44 @@ function App() {
     // eslint-disable-next-line
   }, [showTutorial, playerInfo]);
 
+  // Takes the new scene, or a function from the previous scene to the new
+  // one, so that updates landing within the transition build on each other.
+  const showScene = (update) => {
+    setSceneVisible(false);
+    setTimeout(() => {
+      setScene((prev) => (typeof update === 'function' ? update(prev) : update));
+      setSceneKey((k) => k + 1);
+      setSceneVisible(true);
+    }, 300);
+  };
+
+  // Highlights the item the latest scene update added to the inventory.
+  const previousInventory = useRef(null);
+  useEffect(() => {
+    const prevInv = previousInventory.current;
+    const newInv = scene ? scene.inventory : null;
+    previousInventory.current = newInv;
+    if (!prevInv || !newInv || prevInv === newInv) return;
+    const added = newInv.find(item => !prevInv.includes(item));
+    setNewlyAddedItem(added || null);
+    if (added) setTimeout(() => setNewlyAddedItem(null), 1200);
+  }, [scene]);
+
+  // /command returns only the scene fields it changed, so there is no need
+  // to fetch the whole scene again after every action.
+  const applySceneChanges = (changes) => {
+    if (!scene) {
+      fetchScene();
+      return;
+    }
+    showScene((prev) => (prev ? { ...prev, ...changes } : prev));
+  };
+
   const fetchScene = async () => {
     setLoading(true);
     try {
       const response = await axios.get(`${backendURL}/scene`);
-      setSceneVisible(false);
-      setTimeout(() => {
-        if (scene && response.data && response.data.inventory) {
-          const prevInv = scene.inventory || [];
-          const newInv = response.data.inventory;
-          const added = newInv.find(item => !prevInv.includes(item));
-          setNewlyAddedItem(added || null);
-          if (added) setTimeout(() => setNewlyAddedItem(null), 1200);
-        }
-        setScene(response.data);
-        setSceneKey((k) => k + 1);
-        setSceneVisible(true);
-      }, 300);
+      showScene(response.data);
       setError(null);
       setProgress(100);
       setLoading(false);
@@ -394,7 +438,7 @@ function App() {
     console.log("Predicted intent:", intent);
 
     try {
-      const response = await axios.post(`${backendURL}/command`, { command: commandToSend });
+      const response = await axios.post(`${backendURL}/command`, { command: commandToSend, include: 'diff' });
 
       if (isConversation) {
         setResult(response.data.result || 'Response processed');
@@ -407,7 +451,7 @@ function App() {
       setError(null);
 
       setTimeout(() => {
-        fetchScene();
+        applySceneChanges(response.data.changes);
       }, 500);
 
     } catch (error) {
@@ -421,12 +465,12 @@ function App() {
     setCommandHistory((prev) => [...prev, choice]);
     setHistoryIndex(-1);
     try {
-      const response = await axios.post(`${backendURL}/command`, { command: choice });
+      const response = await axios.post(`${backendURL}/command`, { command: choice, include: 'diff' });
       setResult(response.data.result || 'Command processed');
       setCommand('');
       setError(null);
       setTimeout(() => {
-        fetchScene();
+        applySceneChanges(response.data.changes);
       }, 500);
     } catch (error) {
       setError(error.response?.data?.detail || error.message);
@@ -439,12 +483,12 @@ function App() {
     setCommandHistory((prev) => [...prev, takeCommand]);
     setHistoryIndex(-1);
     try {
-      const response = await axios.post(`${backendURL}/command`, { command: takeCommand });
+      const response = await axios.post(`${backendURL}/command`, { command: takeCommand, include: 'diff' });
       setResult(response.data.result || 'Item taken');
       setCommand('');
       setError(null);
       setTimeout(() => {
-        fetchScene();
+        applySceneChanges(response.data.changes);
       }, 500);
     } catch (error) {
       setError(error.response?.data?.detail || error.message);
@@ -1,5 +1,11 @@
+import argparse
+import hashlib
 import json
 import os
+import sqlite3
+import time
+from core.fileio import write_atomic
+from core.models import Choice, Item, Scene
 
 def load_story(filename="story.json"):
     """Loads the story from a JSON file."""
@@ -17,12 +23,200 @@ def load_story(filename="story.json"):
 def save_story(data, filename="story.json"):
     """Saves the story to a JSON file."""
     try:
-        with open(filename, 'w') as f:
-            json.dump(data, f, indent=2)
+        write_atomic(filename, json.dumps(data, indent=2))
         print(f"Story saved to {filename}")
     except Exception as e:
         print(f"Error saving story: {e}")
 
+class PatchError(ValueError):
+    """Raised when a patch line cannot be applied; nothing is written in that case."""
+
+def _find(entries, key, value, what, scene_id):
+    for index, entry in enumerate(entries):
+        if entry.get(key) == value:
+            return index
+    raise PatchError(f"Scene '{scene_id}' has no {what} '{value}'")
+
+def apply_patches(data, patches):
+    """Applies patch operations to the story in one pass.
+
+    Each patch is a dict with an "op":
+      add_scene {scene}, update_scene {id, set}, delete_scene {id},
+      add_choice / add_item {scene, choice | item},
+      update_choice {scene, action, set}, update_item {scene, name, set},
+      delete_choice {scene, action}, delete_item {scene, name}.
+    Scenes are looked up by id through a dict, so the cost per patch does not
+    depend on the number of scenes. Returns (changed scene ids, deleted scene ids).
+    """
+    scenes = {scene["id"]: scene for scene in data["scenes"]}
+    changed = set()
+    deleted = set()
+    for line, patch in enumerate(patches, 1):
+        op = patch.get("op")
+        try:
+            if op == "add_scene":
+                scene = patch["scene"]
+                Scene(**scene)
+                if scene["id"] in scenes:
+                    raise PatchError(f"Scene '{scene['id']}' already exists")
+                scenes[scene["id"]] = scene
+                changed.add(scene["id"])
+                deleted.discard(scene["id"])
+                continue
+            scene_id = patch["scene"] if "scene" in patch else patch["id"]
+            scene = scenes.get(scene_id)
+            if scene is None:
+                raise PatchError(f"Unknown scene '{scene_id}'")
+            if op == "update_scene":
+                updated = dict(scene, **patch["set"])
+                Scene(**updated)
+                new_id = updated["id"]
+                if new_id != scene_id:
+                    if new_id in scenes:
+                        raise PatchError(f"Scene '{new_id}' already exists")
+                    # Renames keep the scene's position, which needs one pass over the scenes.
+                    scenes = {(new_id if key == scene_id else key): value for key, value in scenes.items()}
+                    changed.discard(scene_id)
+                    deleted.add(scene_id)
+                scene.clear()
+                scene.update(updated)
+                changed.add(new_id)
+                deleted.discard(new_id)
+                continue
+            if op == "delete_scene":
+                del scenes[scene_id]
+                changed.discard(scene_id)
+                deleted.add(scene_id)
+                continue
+            if op == "add_choice":
+                Choice(**patch["choice"])
+                scene.setdefault("choices", []).append(patch["choice"])
+            elif op == "add_item":
+                Item(**patch["item"])
+                scene.setdefault("items", []).append(patch["item"])
+            elif op == "update_choice":
+                choices = scene.get("choices", [])
+                index = _find(choices, "action", patch["action"], "choice", scene_id)
+                choices[index] = dict(choices[index], **patch["set"])
+                Choice(**choices[index])
+            elif op == "update_item":
+                items = scene.get("items", [])
+                index = _find(items, "name", patch["name"], "item", scene_id)
+                items[index] = dict(items[index], **patch["set"])
+                Item(**items[index])
+            elif op == "delete_choice":
+                choices = scene.get("choices", [])
+                del choices[_find(choices, "action", patch["action"], "choice", scene_id)]
+            elif op == "delete_item":
+                items = scene.get("items", [])
+                del items[_find(items, "name", patch["name"], "item", scene_id)]
+            else:
+                raise PatchError(f"Unknown op '{op}'")
+            changed.add(scene_id)
+        except PatchError as e:
+            raise PatchError(f"Patch {line}: {e}")
+        except (KeyError, TypeError, ValueError) as e:
+            raise PatchError(f"Patch {line} ({op}): invalid patch: {e}")
+    data["scenes"] = list(scenes.values())
+    return changed, deleted
+
+def read_patches(filename):
+    """Reads one JSON patch per line, skipping blank lines."""
+    patches = []
+    with open(filename, 'r') as f:
+        for line_number, line in enumerate(f, 1):
+            if line.strip():
+                try:
+                    patches.append(json.loads(line))
+                except json.JSONDecodeError as e:
+                    raise PatchError(f"Line {line_number}: invalid JSON: {e}")
+    return patches
+
+def open_store(path):
+    """Opens (creating if needed) a SQLite store holding one row per scene."""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS scenes ("
+        "id TEXT PRIMARY KEY, position INTEGER NOT NULL, data TEXT NOT NULL)"
+    )
+    return conn
+
+def save_store(conn, data, changed, deleted, story_hash=None):
+    """Writes the metadata and the changed or deleted scenes to the store, in one transaction.
+
+    Every scene's position is brought in line with its index in the story,
+    but only rows whose position moved are updated. `story_hash` records the
+    story.json this store matches; see run_batch().
+    """
+    positions = {scene["id"]: index for index, scene in enumerate(data["scenes"])}
+    stored = dict(conn.execute("SELECT id, position FROM scenes"))
+    deleted = set(deleted) | (stored.keys() - positions.keys())
+    changed = set(changed) | (positions.keys() - stored.keys())
+    moved = [(positions[scene_id], scene_id) for scene_id, position in stored.items()
+             if scene_id in positions and scene_id not in changed and position != positions[scene_id]]
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('metadata', ?)", (json.dumps(data.get("metadata", {})),))
+        if story_hash is not None:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('story_hash', ?)", (story_hash,))
+        conn.executemany("DELETE FROM scenes WHERE id = ?", [(scene_id,) for scene_id in deleted])
+        conn.executemany("UPDATE scenes SET position = ? WHERE id = ?", moved)
+        conn.executemany(
+            "INSERT OR REPLACE INTO scenes (id, position, data) VALUES (?, ?, ?)",
+            [(scene_id, positions[scene_id], json.dumps(data["scenes"][positions[scene_id]])) for scene_id in changed]
+        )
+
+def load_store(conn):
+    """Reads a story back from a store written by save_store()."""
+    row = conn.execute("SELECT value FROM meta WHERE key = 'metadata'").fetchone()
+    scenes = [json.loads(data) for (data,) in conn.execute("SELECT data FROM scenes ORDER BY position, id")]
+    return {"metadata": json.loads(row[0]) if row else {}, "scenes": scenes}
+
+def file_hash(filename):
+    """SHA-1 of a file's bytes, or None if it does not exist."""
+    try:
+        with open(filename, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+def run_batch(patch_file, story_file="story.json", store_path=None):
+    """Applies a JSONL patch file and saves the result. Returns the number of patches applied.
+
+    With a store, the story is read from the store as long as story.json is
+    the file the last batch wrote. If story.json was edited since, it is
+    imported into the store again instead, so those edits are kept.
+    """
+    start = time.perf_counter()
+    conn = open_store(store_path) if store_path else None
+    data = None
+    from_store = False
+    if conn is not None:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'story_hash'").fetchone()
+        if row is not None and row[0] == file_hash(story_file):
+            data = load_store(conn)
+            from_store = True
+        elif row is not None:
+            print(f"{story_file} changed since the last batch; importing it into {store_path}")
+    if data is None:
+        data = load_story(story_file)
+        if data is None:
+            raise PatchError(f"Cannot read {story_file}")
+    data.setdefault("scenes", [])
+    patches = read_patches(patch_file)
+    changed, deleted = apply_patches(data, patches)
+    if not from_store:
+        # The store may hold older copies of any scene: rewrite them all.
+        changed = {scene["id"] for scene in data["scenes"]}
+    text = json.dumps(data, indent=2).encode("utf-8")
+    write_atomic(story_file, text)
+    if conn is not None:
+        save_store(conn, data, changed, deleted, hashlib.sha1(text).hexdigest())
+        conn.close()
+    print(f"Applied {len(patches)} patches ({len(changed)} scenes changed, {len(deleted)} deleted) "
+          f"to {story_file} in {time.perf_counter() - start:.2f}s")
+    return len(patches)
+
 def add_scene(data):
     """Adds a new scene to the story."""
     print("\nAdding a new scene:")
@@ -160,7 +354,21 @@ def edit_scene(data):
 
 def main():
     """Main function to run the story editor."""
-    story_data = load_story()
+    parser = argparse.ArgumentParser(description="Edit story.json interactively or apply a batch of patches.")
+    parser.add_argument("--batch", help="JSONL file of patches to apply without prompting.")
+    parser.add_argument("--story", default="story.json", help="Story file to edit.")
+    parser.add_argument("--store", help="SQLite store that receives only the changed scenes; read instead of the story file when it exists.")
+    args = parser.parse_args()
+
+    if args.batch:
+        try:
+            run_batch(args.batch, args.story, args.store)
+        except (PatchError, OSError) as e:
+            print(f"Error: {e}. Nothing was written.")
+            raise SystemExit(1)
+        return
+
+    story_data = load_story(args.story)
 
     if story_data is None:
         return
@@ -191,7 +399,7 @@ def main():
         elif choice == "2":
             edit_scene(story_data)
         elif choice == "3":
-            save_story(story_data)
+            save_story(story_data, args.story)
         elif choice == "4":
             break
         else: